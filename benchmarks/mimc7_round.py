@@ -0,0 +1,67 @@
+"""
+microbenchmark of the MIMC7 round kernel against the previous F based rounds
+
+run it with: python -m benchmarks.mimc7_round
+"""
+from __future__ import annotations
+
+import random
+import timeit
+
+from chiquito.util import F
+
+from src.mimc7 import MIMC7_CACHE, mimc7, mimc7_round
+from src.mimc7_constants import FIELD_MODULUS, ROUND_CONSTANTS, ROUNDS
+
+SAMPLES = 1000
+REPEAT = 5
+
+
+def legacy_round(x_value, kc_value):
+    x_value += F(kc_value)
+    return F(x_value ** 7)
+
+
+def legacy_mimc7(x_in_value, k_value):
+    c_value = F(ROUND_CONSTANTS[0])
+    x_value = F(x_in_value)
+
+    for i in range(1, ROUNDS):
+        x_value += F(k_value + c_value)
+        x_value = F(x_value ** 7)
+        c_value = F(ROUND_CONSTANTS[i])
+
+    x_value += F(k_value + c_value)
+    x_value = F(x_value ** 7)
+
+    return x_value + k_value
+
+
+def best_of(statement):
+    return min(timeit.repeat(statement, number=1, repeat=REPEAT))
+
+
+def main():
+    inputs = [random.randrange(FIELD_MODULUS) for _ in range(SAMPLES)]
+    kc_value = (10 + ROUND_CONSTANTS[1]) % FIELD_MODULUS
+
+    legacy_rounds = best_of(lambda: [legacy_round(F(x_value), kc_value) for x_value in inputs])
+    rounds = best_of(lambda: [mimc7_round(x_value, kc_value) for x_value in inputs])
+    print(f"round  F ** 7: {legacy_rounds / SAMPLES * 1e6:8.2f} us  "
+          f"kernel: {rounds / SAMPLES * 1e6:8.2f} us  speedup: {legacy_rounds / rounds:.2f}x")
+
+    # the cache would turn every repetition into a lookup
+    maxsize = MIMC7_CACHE.maxsize
+    MIMC7_CACHE.resize(0)
+    try:
+        hash_inputs = inputs[:SAMPLES // 10]
+        legacy_hashes = best_of(lambda: [legacy_mimc7(x_value, 10) for x_value in hash_inputs])
+        hashes = best_of(lambda: [mimc7(x_value, 10) for x_value in hash_inputs])
+    finally:
+        MIMC7_CACHE.resize(maxsize)
+    print(f"hash   F ** 7: {legacy_hashes / len(hash_inputs) * 1e6:8.2f} us  "
+          f"kernel: {hashes / len(hash_inputs) * 1e6:8.2f} us  speedup: {legacy_hashes / hashes:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+benchmarks of the witness generation and mock proving of the super circuits
+
+run it with: make bench, or python -m benchmarks.suite [--save-baseline] [--threshold 0.2]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from chiquito.util import F
+
+from src.identity_cache import IDENTITY_CACHE
+from src.inclusion_proof import MtipSuperCircuit
+from src.mimc7 import MIMC7_CACHE
+from src.mimc7_constants import FIELD_MODULUS
+from src.mimc7_multi import Mimc7MultiSuperCircuit
+from src.semaphore import SemaphoreSuperCircuit
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_THRESHOLD = 0.2
+SEED = 1234
+
+# (super circuit, size name, size) of every case, the size being the number of hashes or the tree depth
+CASES = [
+    ("mimc7_multi", "hashes", 8),
+    ("mimc7_multi", "hashes", 32),
+    ("mimc7_multi", "hashes", 128),
+    ("mtip", "depth", 10),
+    ("mtip", "depth", 20),
+    ("semaphore", "depth", 10),
+    ("semaphore", "depth", 20),
+]
+
+
+def field_elements(rng, count):
+    return [F(rng.randrange(FIELD_MODULUS)) for _ in range(count)]
+
+
+def case_inputs(name, size):
+    rng = random.Random(SEED)
+    if name == "mimc7_multi":
+        return Mimc7MultiSuperCircuit(num_hashes=size), (field_elements(rng, size), F(10))
+    path_indices = [F(rng.randrange(2)) for _ in range(size)]
+    if name == "mtip":
+        return MtipSuperCircuit(n_levels=size), (F(1), field_elements(rng, size), path_indices, F(1))
+    identity_nullifier, identity_trapdoor, signal_hash = field_elements(rng, 3)
+    return SemaphoreSuperCircuit(n_levels=size), (
+        identity_nullifier,
+        identity_trapdoor,
+        field_elements(rng, size),
+        path_indices,
+        signal_hash,
+        F(1),
+    )
+
+
+def run_case(name, size):
+    """
+    runs a single case, meant to be called in a fresh process so the peak RSS is its own
+    """
+    start = time.perf_counter()
+    super_circuit, args = case_inputs(name, size)
+    setup_time = time.perf_counter() - start
+
+    # every case starts with cold hashes
+    MIMC7_CACHE.clear()
+    IDENTITY_CACHE.clear()
+    start = time.perf_counter()
+    super_witness = super_circuit.gen_witness(*args)
+    witness_time = time.perf_counter() - start
+    steps = sum(len(witness.step_instances) for witness in super_witness.values())
+
+    start = time.perf_counter()
+    super_circuit.halo2_mock_prover(super_witness)
+    prover_time = time.perf_counter() - start
+
+    return {
+        "setup_s": setup_time,
+        "gen_witness_s": witness_time,
+        "mock_prover_s": prover_time,
+        "steps": steps,
+        "steps_per_s": steps / witness_time,
+        # kilobytes on linux
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def run_suite():
+    results = {}
+    for name, size_name, size in CASES:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            results[f"{name}[{size_name}={size}]"] = executor.submit(run_case, name, size).result()
+    return results
+
+
+def regressions(results, baseline, threshold):
+    """
+    returns a message for every timing that got slower than the baseline by more than the threshold
+    """
+    messages = []
+    for case, result in results.items():
+        if case not in baseline:
+            continue
+        for metric in ["gen_witness_s", "mock_prover_s"]:
+            previous = baseline[case][metric]
+            if result[metric] > previous * (1 + threshold):
+                messages.append(f"{case} {metric}: {result[metric]:.3f}s, baseline {previous:.3f}s")
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown over the baseline, 0.2 being 20%%")
+    args = parser.parse_args()
+
+    results = run_suite()
+
+    print(f"{'case':<28}{'setup s':>10}{'witness s':>11}{'prover s':>10}{'steps':>8}{'steps/s':>10}{'rss MB':>9}")
+    for case, result in results.items():
+        print(
+            f"{case:<28}{result['setup_s']:>10.3f}{result['gen_witness_s']:>11.3f}{result['mock_prover_s']:>10.3f}"
+            f"{result['steps']:>8}{result['steps_per_s']:>10.0f}{result['peak_rss_kb'] / 1024:>9.1f}"
+        )
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}, run with --save-baseline to create it")
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    messages = regressions(results, baseline, args.threshold)
+    for message in messages:
+        print(f"REGRESSION {message}")
+    return 1 if messages else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import hashlib
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import NamedTuple
+
+from src.mimc7 import Mimc7Trace, _compute_mimc7_trace
+from src.mimc7_constants import FIELD_MODULUS
+
+IDENTITY_CACHE_SIZE = 1024
+# seconds an identity is kept after it's computed
+IDENTITY_CACHE_TTL = 3600.0
+
+
+class Identity(NamedTuple):
+    """
+    values derived from an identity, with the MIMC7 traces of their hashes
+    """
+    secret_trace: Mimc7Trace
+    commitment_trace: Mimc7Trace
+
+    @property
+    def secret(self):
+        return self.secret_trace.out
+
+    @property
+    def commitment(self):
+        return self.commitment_trace.out
+
+
+class IdentityCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    expired: int
+    maxsize: int
+    ttl: float
+    currsize: int
+
+
+def identity_key(identity_nullifier, identity_trapdoor, k_value) -> bytes:
+    """
+    returns the cache key of an identity, a digest so the keys don't hold the identity values
+    """
+    digest = hashlib.sha256()
+    for value in (identity_nullifier, identity_trapdoor, k_value):
+        digest.update((int(value) % FIELD_MODULUS).to_bytes(32, "little"))
+    return digest.digest()
+
+
+class IdentityCache:
+    """
+    bounded LRU cache of the secret and commitment of identities, with their traces, dropped after ttl seconds.
+    purge removes an identity at once, e.g. when its keys are rotated.
+    The cache is per process, the pool workers of prove_batch and AsyncProver run without it.
+    """
+
+    def __init__(self, maxsize, ttl, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        # (expiry time, identity) by key
+        self._identities = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, identity_nullifier, identity_trapdoor, k_value):
+        key = identity_key(identity_nullifier, identity_trapdoor, k_value)
+        with self._lock:
+            cached = self._identities.get(key)
+            if cached is not None and cached[0] <= self.clock():
+                del self._identities[key]
+                self.expired += 1
+                cached = None
+            if cached is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._identities.move_to_end(key)
+            return cached[1]
+
+    def put(self, identity_nullifier, identity_trapdoor, k_value, identity):
+        key = identity_key(identity_nullifier, identity_trapdoor, k_value)
+        with self._lock:
+            if self.maxsize <= 0:
+                return
+            self._identities[key] = (self.clock() + self.ttl, identity)
+            self._identities.move_to_end(key)
+            while len(self._identities) > self.maxsize:
+                self._identities.popitem(last=False)
+
+    def identity(self, identity_nullifier, identity_trapdoor, k_value) -> Identity:
+        """
+        returns the secret and commitment of the identity, computing them if they aren't cached.
+        They are computed without the MIMC7 traces cache, so purging or expiring them leaves no copy behind.
+        """
+        identity = self.get(identity_nullifier, identity_trapdoor, k_value)
+        if identity is None:
+            k = int(k_value) % FIELD_MODULUS
+            secret_trace = _compute_mimc7_trace((int(identity_nullifier) + int(identity_trapdoor)) % FIELD_MODULUS, k)
+            identity = Identity(secret_trace, _compute_mimc7_trace(secret_trace.out, k))
+            self.put(identity_nullifier, identity_trapdoor, k_value, identity)
+        return identity
+
+    def purge(self, identity_nullifier, identity_trapdoor, k_value):
+        """
+        drops the identity, returns whether it was cached
+        """
+        key = identity_key(identity_nullifier, identity_trapdoor, k_value)
+        with self._lock:
+            return self._identities.pop(key, None) is not None
+
+    def purge_expired(self):
+        """
+        drops the identities past their ttl, returns how many
+        """
+        with self._lock:
+            now = self.clock()
+            expired = [key for key, (expiry, _) in self._identities.items() if expiry <= now]
+            for key in expired:
+                del self._identities[key]
+            self.expired += len(expired)
+            return len(expired)
+
+    def resize(self, maxsize):
+        """
+        changes the number of identities kept, evicting the least recently used ones if needed
+        """
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._identities) > max(maxsize, 0):
+                self._identities.popitem(last=False)
+
+    def clear(self):
+        """
+        drops every cached identity and resets the counters
+        """
+        with self._lock:
+            self._identities.clear()
+            self.hits = 0
+            self.misses = 0
+            self.expired = 0
+
+    def info(self) -> IdentityCacheInfo:
+        with self._lock:
+            return IdentityCacheInfo(
+                self.hits,
+                self.misses,
+                self.expired,
+                self.maxsize,
+                self.ttl,
+                len(self._identities),
+            )
+
+
+IDENTITY_CACHE = IdentityCache(IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL)
@@ -6,12 +6,22 @@ from chiquito.cb import eq
 from chiquito.expr import to_expr
 from chiquito.util import F
 
-from src.mimc7_constants import ROUND_CONSTANTS, ROUNDS
-from src.mimc7_multi import Mimc7MultiCircuit, Mimc7Constants
+from src.instrumentation import Instrumented
+from src.mimc7 import mimc7, mimc7_trace
+from src.mimc7_multi import MIMC7_LAYOUT_ROUNDS, mimc7_sub_circuit, size_class
 
 N_LEVELS = 20
 
 
+def level_input(node, sibling, path_index):
+    """
+    returns the input of the MIMC7 hash of a tree level, from its node, the sibling and the index of the node
+    """
+    input_1 = ((sibling - node) * path_index) + node
+    input_2 = ((node - sibling) * path_index) + sibling
+    return input_1 + input_2
+
+
 class MtipStep(StepType):
     def setup(self):
         self.index = self.internal("index")
@@ -35,6 +45,9 @@ class MtipStep(StepType):
 
 
 class MtipCircuit(Circuit):
+    # depth of the tree, can be set with the `n_levels` argument of the constructor
+    n_levels = N_LEVELS
+
     def setup(self):
         # define signals
         self.result = self.forward("result")
@@ -44,7 +57,7 @@ class MtipCircuit(Circuit):
         self.step = self.step_type(MtipStep(self, "step"))
 
         # define circuit constraints
-        self.pragma_num_steps(N_LEVELS)
+        self.pragma_num_steps(self.n_levels)
         self.pragma_first_step(self.step)
         self.pragma_last_step(self.step)
 
@@ -53,58 +66,116 @@ class MtipCircuit(Circuit):
 
     def trace(self, path_indices, inputs, hashes):
         # for each level
-        for i in range(0, N_LEVELS):
+        for i in range(0, self.n_levels):
             # add step with the results
             self.add(self.step, path_indices[i], hashes[i + 1], hashes[i], inputs[i])
 
 
-class MtipSuperCircuit(SuperCircuit):
+class MtipSuperCircuit(Instrumented, SuperCircuit):
+    def __init__(self, n_levels=N_LEVELS, layout=MIMC7_LAYOUT_ROUNDS, columnar=False):
+        self.n_levels = n_levels
+        self.layout = layout
+        self.columnar = columnar
+        super().__init__()
+
     def setup(self):
-        self.mimc7_constants = self.sub_circuit(Mimc7Constants(self))
-        self.mimc7_multi_circuit = self.sub_circuit(
-            Mimc7MultiCircuit(self, constants_table=self.mimc7_constants.lookup_table)
-        )
+        self.mimc7_multi_circuit = mimc7_sub_circuit(self, size_class(self.n_levels), self.layout, self.columnar)
         self.mtip_circuit = self.sub_circuit(
-            MtipCircuit(self, hashes_table=self.mimc7_multi_circuit.hashes_table)
+            MtipCircuit(
+                self,
+                hashes_table=self.mimc7_multi_circuit.hashes_table,
+                n_levels=self.n_levels,
+            )
         )
 
     def mapping(self, leaf, siblings, path_indices, k_value):
-        x_values = []
-        hashes = [leaf]
-        for i in range(0, N_LEVELS):
-            # compute the MIMC7 hash of this level
-            input_1 = ((siblings[i] - hashes[i]) * path_indices[i]) + hashes[i]
-            input_2 = ((hashes[i] - siblings[i]) * path_indices[i]) + siblings[i]
-            x_values.append(input_1 + input_2)
-            result = self.mimc7(x_values[i], k_value)
-            # append the hash to the list
-            hashes.append(result)
+        x_values, traces, hashes = self.path_hashes(leaf, siblings, path_indices, k_value)
 
-        # this first circuit will compute and store all the hashes on a lookup table,
-        # that will allow the next circuit to add lookup constraints to verify that the given
-        # values are correct by checking their existence on the table.
-        self.map(self.mimc7_multi_circuit, x_values, k_value)
+        # this first circuit will store all the hashes on a lookup table, replaying the rounds
+        # recorded above, that will allow the next circuit to add lookup constraints to verify that
+        # the given values are correct by checking their existence on the table.
+        self.map(self.mimc7_multi_circuit, x_values, k_value, traces)
 
         # next circuit constraints the given hashes to exist on the lookup table,
         # that protects the MTIP circuit from using crafted hashes
         self.map(self.mtip_circuit, path_indices, x_values, hashes)
 
+    def path_hashes(self, leaf, siblings, path_indices, k_value):
+        """
+        computes the hash of every level of the path, returns the hashed inputs, their MIMC7 traces and the hashes
+        """
+        x_values = []
+        traces = []
+        hashes = [leaf]
+        for i in range(0, self.n_levels):
+            # compute the MIMC7 hash of this level
+            x_values.append(level_input(hashes[i], siblings[i], path_indices[i]))
+            traces.append(mimc7_trace(x_values[i], k_value))
+            # append the hash to the list
+            hashes.append(F(traces[i].out))
+        return x_values, traces, hashes
+
     def mimc7(self, x_in_value, k_value):
         """
         this helper allows us to compute the MIMC7 hash values from the trace
         """
-        c_value = F(ROUND_CONSTANTS[0])
-        x_value = F(x_in_value)
-        row_value = F(0)
+        return F(mimc7(x_in_value, k_value))
+
 
-        for i in range(1, ROUNDS):
-            row_value += F(1)
-            x_value += F(k_value + c_value)
-            x_value = F(x_value ** 7)
-            c_value = F(ROUND_CONSTANTS[i])
+class MtipBatchSuperCircuit(MtipSuperCircuit):
+    """
+    proves the inclusion of several leaves in the same tree, with one MTIP circuit per leaf
+    looking up a single hashes table, where the hashes shared by their paths appear only once
+    """
 
-        row_value += F(1)
-        x_value += F(k_value + c_value)
-        x_value = F(x_value ** 7)
+    def __init__(self, num_leaves, n_levels=N_LEVELS, layout=MIMC7_LAYOUT_ROUNDS, columnar=False):
+        self.num_leaves = num_leaves
+        super().__init__(n_levels, layout, columnar)
+
+    def setup(self):
+        # the paths to the same root share at least the hash of the last level
+        num_hashes = self.num_leaves * (self.n_levels - 1) + 1
+        self.mimc7_multi_circuit = mimc7_sub_circuit(self, size_class(num_hashes), self.layout, self.columnar)
+        self.mtip_circuits = [
+            self.sub_circuit(
+                MtipCircuit(
+                    self,
+                    hashes_table=self.mimc7_multi_circuit.hashes_table,
+                    n_levels=self.n_levels,
+                )
+            )
+            for _ in range(0, self.num_leaves)
+        ]
+
+    def mapping(self, leaves, siblings, path_indices, k_value):
+        """
+        siblings and path_indices hold the path of every leaf
+        """
+        if len(leaves) != self.num_leaves:
+            raise ValueError(f"Expected {self.num_leaves} leaves, got {len(leaves)}")
+
+        paths = [
+            self.path_hashes(leaf, leaf_siblings, leaf_path_indices, k_value)
+            for leaf, leaf_siblings, leaf_path_indices in zip(leaves, siblings, path_indices)
+        ]
+
+        # the leaves must be in the same tree
+        roots = [int(hashes[-1]) for _, _, hashes in paths]
+        if any(root != roots[0] for root in roots):
+            raise ValueError(f"The paths of the leaves lead to {len(set(roots))} different roots")
+
+        # this first circuit will store all the hashes on a lookup table, replaying the rounds
+        # recorded above, that will allow the next circuits to add lookup constraints to verify that
+        # the given values are correct by checking their existence on the table.
+        # The inputs shared by several paths are added only once.
+        self.map(
+            self.mimc7_multi_circuit,
+            [x_value for x_values, _, _ in paths for x_value in x_values],
+            k_value,
+            [recorded for _, traces, _ in paths for recorded in traces],
+        )
 
-        return x_value + k_value
+        # next circuits constraint the hashes of every path to exist on the lookup table,
+        # that protects the MTIP circuits from using crafted hashes
+        for mtip_circuit, leaf_path_indices, (x_values, _, hashes) in zip(self.mtip_circuits, path_indices, paths):
+            self.map(mtip_circuit, leaf_path_indices, x_values, hashes)
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import time
+from collections import defaultdict
+from threading import Lock
+from typing import NamedTuple
+
+
+class StageEvent(NamedTuple):
+    """
+    timing of a stage of a super circuit: the whole gen_witness, the map of a sub-circuit, or the mock prover
+    """
+    super_circuit: str
+    stage: str
+    duration: float
+    real_steps: int = 0
+    padding_steps: int = 0
+
+
+class Instrumented:
+    """
+    super circuit mixin, sending a StageEvent to `observer` for every stage when it's set.
+    The time of gen_witness not spent in the map calls is the hashing done by the mapping itself.
+    """
+    observer = None
+
+    def gen_witness(self, *args):
+        if self.observer is None:
+            return super().gen_witness(*args)
+
+        # (real steps, padding steps) of every mapped sub-circuit
+        self.mapped_steps = []
+        start = time.perf_counter()
+        super_witness = super().gen_witness(*args)
+        duration = time.perf_counter() - start
+
+        self.observer(
+            StageEvent(
+                type(self).__name__,
+                "gen_witness",
+                duration,
+                sum(real_steps for real_steps, _ in self.mapped_steps),
+                sum(padding_steps for _, padding_steps in self.mapped_steps),
+            )
+        )
+        return super_witness
+
+    def map(self, circuit, *args):
+        if self.observer is None:
+            return super().map(circuit, *args)
+
+        start = time.perf_counter()
+        super().map(circuit, *args)
+        duration = time.perf_counter() - start
+
+        # the MIMC7 circuits keep their step counts, a columnar witness has no step instances to count
+        padding_steps = getattr(circuit, "padding_steps", 0)
+        real_steps = getattr(circuit, "real_steps", None)
+        if real_steps is None:
+            real_steps = len(circuit.witness.step_instances) - padding_steps
+
+        self.mapped_steps.append((real_steps, padding_steps))
+        self.observer(
+            StageEvent(type(self).__name__, f"map:{type(circuit).__name__}", duration, real_steps, padding_steps)
+        )
+
+    def halo2_mock_prover(self, super_witness, *args, **kwargs):
+        if self.observer is None:
+            return super().halo2_mock_prover(super_witness, *args, **kwargs)
+
+        start = time.perf_counter()
+        result = super().halo2_mock_prover(super_witness, *args, **kwargs)
+        self.observer(StageEvent(type(self).__name__, "halo2_mock_prover", time.perf_counter() - start))
+        return result
+
+
+class StageCounters:
+    """
+    observer accumulating the events of every super circuit and stage, to be scraped with snapshot
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counters = defaultdict(lambda: {"count": 0, "seconds": 0.0, "real_steps": 0, "padding_steps": 0})
+
+    def __call__(self, event):
+        with self._lock:
+            counters = self._counters[f"{event.super_circuit}.{event.stage}"]
+            counters["count"] += 1
+            counters["seconds"] += event.duration
+            counters["real_steps"] += event.real_steps
+            counters["padding_steps"] += event.padding_steps
+
+    def snapshot(self):
+        """
+        returns the counters keyed by "<super circuit>.<stage>"
+        """
+        with self._lock:
+            return {key: dict(counters) for key, counters in self._counters.items()}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+
+# every node hash is stored as a 32 bytes little endian record
+RECORD_SIZE = 32
+
+# file header: magic, depth and number of leaves, padded to a record
+HEADER = struct.Struct("<8sIQ")
+MAGIC = b"MIMCTREE"
+HEADER_SIZE = RECORD_SIZE
+
+EMPTY_RECORD = bytes(RECORD_SIZE)
+
+
+class MemoryStorage:
+    """
+    keeps the nodes of a Merkle tree in one {index: hash} dict per level, from the leaves to the root
+    """
+    # a node hashing to 0 is told apart from an empty subtree
+    stores_zero = True
+
+    def __init__(self, depth):
+        self.depth = depth
+        self.size = 0
+        self.nodes = [{} for _ in range(0, depth + 1)]
+
+    def get(self, level, index):
+        """
+        returns the hash of the node, or None if it's the root of an empty subtree
+        """
+        return self.nodes[level].get(index)
+
+    def set(self, level, index, value):
+        self.nodes[level][index] = value
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class MmapStorage:
+    """
+    keeps the nodes of a Merkle tree in a memory mapped file, laid out level by level from the leaves to the root.
+    A record of zeros is the root of an empty subtree.
+    The file can be opened read only by several processes, e.g. provers reading the sibling paths.
+    """
+    # a node hashing to 0 reads back as an empty subtree, so the empty leaf must be 0
+    stores_zero = False
+
+    def __init__(self, path, depth, readonly=False):
+        self.path = path
+        self.depth = depth
+        self.readonly = readonly
+        # offset of the first record of every level
+        self.offsets = []
+        offset = HEADER_SIZE
+        for level in range(0, depth + 1):
+            self.offsets.append(offset)
+            offset += RECORD_SIZE << (depth - level)
+
+        if not os.path.exists(path):
+            if readonly:
+                raise FileNotFoundError(path)
+            with open(path, "wb") as file:
+                file.write(HEADER.pack(MAGIC, depth, 0).ljust(HEADER_SIZE, b"\0"))
+                # the file is sparse, pages of empty subtrees are never written
+                file.truncate(offset)
+
+        with open(path, "rb" if readonly else "r+b") as file:
+            self.mmap = mmap.mmap(
+                file.fileno(),
+                0,
+                access=mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE,
+            )
+
+        magic, file_depth, _ = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC:
+            self.mmap.close()
+            raise ValueError(f"{path} is not a Merkle tree file")
+        if file_depth != depth or len(self.mmap) != offset:
+            self.mmap.close()
+            raise ValueError(f"{path} holds a tree of depth {file_depth}, not {depth}")
+
+    @property
+    def size(self):
+        return HEADER.unpack_from(self.mmap, 0)[2]
+
+    @size.setter
+    def size(self, size):
+        HEADER.pack_into(self.mmap, 0, MAGIC, self.depth, size)
+
+    def raw(self, level, index):
+        """
+        returns a zero copy view of the record of the node, it must be released before closing the storage
+        """
+        offset = self.offsets[level] + index * RECORD_SIZE
+        return memoryview(self.mmap)[offset:offset + RECORD_SIZE]
+
+    def get(self, level, index):
+        """
+        returns the hash of the node, or None if it's the root of an empty subtree
+        """
+        record = self.raw(level, index)
+        if record == EMPTY_RECORD:
+            return None
+        return int.from_bytes(record, "little")
+
+    def set(self, level, index, value):
+        offset = self.offsets[level] + index * RECORD_SIZE
+        self.mmap[offset:offset + RECORD_SIZE] = value.to_bytes(RECORD_SIZE, "little")
+
+    def flush(self):
+        if not self.readonly:
+            self.mmap.flush()
+
+    def close(self):
+        self.flush()
+        self.mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+
+from chiquito.util import F
+
+from src.merkle_storage import MemoryStorage
+from src.mimc7 import mimc7_batch, mimc7_hash
+from src.mimc7_constants import FIELD_MODULUS
+from src.semaphore import K_VALUE, N_LEVELS
+
+# levels with fewer hashes than this are hashed in the current process
+PARALLEL_MIN_HASHES = 4096
+
+
+def zero_hashes(depth, k_value, zero_value=0):
+    """
+    returns the root of an empty subtree for every level, from the leaves (level 0) to the root (level depth)
+    """
+    return list(_zero_hashes(depth, int(k_value) % FIELD_MODULUS, int(zero_value) % FIELD_MODULUS))
+
+
+@lru_cache(maxsize=None)
+def _zero_hashes(depth, k, zero):
+    # computed once per process for every depth, key and empty leaf
+    zeros = [zero]
+    for _ in range(0, depth):
+        zeros.append(mimc7_hash(zeros[-1] + zeros[-1], k))
+    return tuple(zeros)
+
+
+class MerkleTree:
+    """
+    incremental Merkle tree hashing its nodes like the MTIP circuits do, a parent being MIMC7(left + right).
+    Only the nodes that differ from the empty subtree of their level are stored, in memory by default,
+    or in any storage of merkle_storage, like a memory mapped file.
+    """
+
+    def __init__(self, depth=N_LEVELS, k_value=K_VALUE, zero_value=0, storage=None):
+        if storage is None:
+            storage = MemoryStorage(depth)
+        if storage.depth != depth:
+            raise ValueError(f"The storage holds a tree of depth {storage.depth}, not {depth}")
+        if int(zero_value) % FIELD_MODULUS != 0 and not storage.stores_zero:
+            raise ValueError(f"{type(storage).__name__} can't hold a tree with a non zero empty leaf")
+        self.depth = depth
+        self.k_value = k_value
+        self.zeros = zero_hashes(depth, k_value, zero_value)
+        self.storage = storage
+
+    @property
+    def size(self):
+        return self.storage.size
+
+    @property
+    def root(self):
+        return F(self.node(self.depth, 0))
+
+    def node(self, level, index):
+        value = self.storage.get(level, index)
+        return self.zeros[level] if value is None else value
+
+    def leaf(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError(f"Leaf {index} out of range, the tree has {self.size} leaves")
+        return F(self.node(0, index))
+
+    def insert(self, leaf):
+        """
+        appends a leaf and updates its path to the root, returns its index
+        """
+        if self.size >= 1 << self.depth:
+            raise ValueError(f"The tree of depth {self.depth} is full")
+        self.storage.size += 1
+        self.update(self.size - 1, leaf)
+        return self.size - 1
+
+    def update(self, index, leaf):
+        """
+        replaces the leaf at the given index, recomputing only the hashes of its path to the root
+        """
+        if not 0 <= index < self.size:
+            raise IndexError(f"Leaf {index} out of range, the tree has {self.size} leaves")
+
+        value = int(leaf) % FIELD_MODULUS
+        for level in range(0, self.depth):
+            self.storage.set(level, index, value)
+            value = mimc7_hash(value + self.node(level, index ^ 1), self.k_value)
+            index >>= 1
+        self.storage.set(self.depth, index, value)
+
+    def proof(self, index):
+        """
+        returns the siblings and path indices of the leaf at the given index, as expected by the MTIP circuits
+        """
+        if not 0 <= index < self.size:
+            raise IndexError(f"Leaf {index} out of range, the tree has {self.size} leaves")
+
+        siblings = []
+        path_indices = []
+        for level in range(0, self.depth):
+            siblings.append(F(self.node(level, index ^ 1)))
+            path_indices.append(F(index & 1))
+            index >>= 1
+        return siblings, path_indices
+
+
+def build_tree(leaves, depth=N_LEVELS, k_value=K_VALUE, zero_value=0, storage=None, workers=None):
+    """
+    builds the tree holding the given leaves, hashing every level as a single batch.
+    The levels with many hashes are split across a pool of processes, unless workers is 1.
+    """
+    tree = MerkleTree(depth, k_value, zero_value, storage)
+    if tree.size != 0:
+        raise ValueError("The storage already holds a tree")
+    if len(leaves) > 1 << depth:
+        raise ValueError(f"{len(leaves)} leaves do not fit in a tree of depth {depth}")
+
+    level_values = [int(leaf) % FIELD_MODULUS for leaf in leaves]
+    workers = workers or os.cpu_count() or 1
+    executor = None
+    if workers > 1 and len(level_values) // 2 >= PARALLEL_MIN_HASHES:
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+    try:
+        for level in range(0, depth + 1):
+            for index, value in enumerate(level_values):
+                tree.storage.set(level, index, value)
+            if level == depth:
+                break
+
+            # the last node without a sibling is paired with the empty subtree
+            if len(level_values) % 2 == 1:
+                level_values.append(tree.zeros[level])
+            inputs = [level_values[i] + level_values[i + 1] for i in range(0, len(level_values), 2)]
+
+            if executor is not None and len(inputs) >= PARALLEL_MIN_HASHES:
+                chunk_size = -(-len(inputs) // workers)
+                chunks = [inputs[i:i + chunk_size] for i in range(0, len(inputs), chunk_size)]
+                level_values = [
+                    value for chunk in executor.map(mimc7_batch, chunks, repeat(k_value)) for value in chunk
+                ]
+            else:
+                level_values = mimc7_batch(inputs, k_value)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    tree.storage.size = len(leaves)
+    return tree
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from threading import Lock
+from typing import Iterable, List, NamedTuple, Tuple
+
+from src.mimc7_constants import FIELD_MODULUS, ROUND_CONSTANTS, ROUNDS
+
+MIMC7_CACHE_SIZE = 512
+
+
+class Mimc7Trace(NamedTuple):
+    """
+    recorded MIMC7 computation, holding one (x, k, c, row) tuple for every row
+    of the hash in the Mimc7MultiCircuit, plus the resulting hash
+    """
+    x_in: int
+    k: int
+    rounds: Tuple[Tuple[int, int, int, int], ...]
+    out: int
+
+
+class Mimc7CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class Mimc7Cache:
+    """
+    bounded LRU cache of MIMC7 traces keyed by (x, k), shared by every circuit of the process
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._traces = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            recorded = self._traces.get(key)
+            if recorded is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._traces.move_to_end(key)
+            return recorded
+
+    def put(self, key, recorded):
+        with self._lock:
+            if self.maxsize <= 0:
+                return
+            self._traces[key] = recorded
+            self._traces.move_to_end(key)
+            while len(self._traces) > self.maxsize:
+                self._traces.popitem(last=False)
+
+    def resize(self, maxsize):
+        """
+        changes the number of traces kept, evicting the least recently used ones if needed
+        """
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._traces) > max(maxsize, 0):
+                self._traces.popitem(last=False)
+
+    def clear(self):
+        """
+        drops every cached trace and resets the counters
+        """
+        with self._lock:
+            self._traces.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> Mimc7CacheInfo:
+        with self._lock:
+            return Mimc7CacheInfo(self.hits, self.misses, self.maxsize, len(self._traces))
+
+
+MIMC7_CACHE = Mimc7Cache(MIMC7_CACHE_SIZE)
+
+
+def mimc7_round(x, kc) -> int:
+    """
+    computes a single MIMC7 round (x + k + c)^7 on raw ints, kc being the key plus the round constant,
+    using the x^2, x^3, x^6, x^7 addition chain instead of a generic modular exponentiation
+    """
+    t = (x + kc) % FIELD_MODULUS
+    t2 = t * t % FIELD_MODULUS
+    t3 = t2 * t % FIELD_MODULUS
+    t6 = t3 * t3 % FIELD_MODULUS
+    return t6 * t % FIELD_MODULUS
+
+
+def mimc7_trace(x_in_value, k_value) -> Mimc7Trace:
+    """
+    computes the MIMC7 hash of the input, recording the state of every round,
+    so the circuits can replay it without computing the rounds again
+    """
+    x_in = int(x_in_value) % FIELD_MODULUS
+    k = int(k_value) % FIELD_MODULUS
+
+    recorded = MIMC7_CACHE.get((x_in, k))
+    if recorded is None:
+        recorded = _compute_mimc7_trace(x_in, k)
+        MIMC7_CACHE.put((x_in, k), recorded)
+
+    return recorded
+
+
+def mimc7(x_in_value, k_value) -> int:
+    """
+    computes the MIMC7 hash of the input
+    """
+    return mimc7_trace(x_in_value, k_value).out
+
+
+def mimc7_hash(x_in_value, k_value) -> int:
+    """
+    computes the MIMC7 hash of the input without recording its rounds nor using the traces cache,
+    for the hashes no circuit replays, like the nodes of a Merkle tree
+    """
+    x = int(x_in_value) % FIELD_MODULUS
+    k = int(k_value) % FIELD_MODULUS
+
+    for row in range(0, ROUNDS):
+        x = mimc7_round(x, k + ROUND_CONSTANTS[row])
+
+    return (x + k) % FIELD_MODULUS
+
+
+def mimc7_batch(x_values: Iterable, k_value) -> List[int]:
+    """
+    computes the MIMC7 hashes of many inputs at once, running each round for all of them together
+    """
+    k = int(k_value) % FIELD_MODULUS
+    states = [int(x_value) % FIELD_MODULUS for x_value in x_values]
+
+    for row in range(0, ROUNDS):
+        kc = k + ROUND_CONSTANTS[row]
+        states = [mimc7_round(x, kc) for x in states]
+
+    return [(x + k) % FIELD_MODULUS for x in states]
+
+
+def mimc7_batch_traces(x_values: Iterable, k_value) -> List[Mimc7Trace]:
+    """
+    same as mimc7_trace for many inputs, computing the ones missing from the cache as a single batch
+    """
+    k = int(k_value) % FIELD_MODULUS
+    x_ins = [int(x_value) % FIELD_MODULUS for x_value in x_values]
+    traces = [MIMC7_CACHE.get((x_in, k)) for x_in in x_ins]
+
+    # several entries can share an input, it's computed only once
+    missing = list(dict.fromkeys(x_in for x_in, recorded in zip(x_ins, traces) if recorded is None))
+    if missing:
+        computed = dict(zip(missing, _compute_mimc7_batch_traces(missing, k)))
+        for x_in, recorded in computed.items():
+            MIMC7_CACHE.put((x_in, k), recorded)
+        traces = [computed[x_in] if recorded is None else recorded for x_in, recorded in zip(x_ins, traces)]
+
+    return traces
+
+
+def _compute_mimc7_batch_traces(x_ins, k) -> List[Mimc7Trace]:
+    # keeps one list of states per round, holding the state of every input
+    columns = [x_ins]
+
+    for row in range(0, ROUNDS):
+        kc = k + ROUND_CONSTANTS[row]
+        columns.append([mimc7_round(x, kc) for x in columns[row]])
+
+    rows = [(k, ROUND_CONSTANTS[row], row) for row in range(0, ROUNDS)]
+    rows.append((k, ROUND_CONSTANTS[ROUNDS - 1], ROUNDS))
+
+    return [
+        Mimc7Trace(
+            x_in,
+            k,
+            tuple((column[j], *row) for column, row in zip(columns, rows)),
+            (columns[ROUNDS][j] + k) % FIELD_MODULUS,
+        )
+        for j, x_in in enumerate(x_ins)
+    ]
+
+
+def _compute_mimc7_trace(x_in, k) -> Mimc7Trace:
+    x = x_in
+    rounds = []
+
+    for row in range(0, ROUNDS):
+        c = ROUND_CONSTANTS[row]
+        rounds.append((x, k, c, row))
+        x = mimc7_round(x, k + c)
+
+    # the last row only adds the key, it carries the constant of the last round
+    rounds.append((x, k, ROUND_CONSTANTS[ROUNDS - 1], ROUNDS))
+
+    return Mimc7Trace(x_in, k, tuple(rounds), (x + k) % FIELD_MODULUS)
@@ -1,3 +1,6 @@
+# order of the BN254 scalar field, the field every circuit value lives in
+FIELD_MODULUS = 21888242871839275222246405745257275088548364400416034343698204186575808495617
+
 ROUNDS = 91
 
 ROUND_CONSTANTS = [
@@ -4,10 +4,65 @@ from chiquito.dsl import SuperCircuit, Circuit, StepType
 from chiquito.cb import table, eq
 from chiquito.util import F
 
+from src.mimc7 import mimc7_batch_traces, mimc7_trace
 from src.mimc7_constants import ROUND_CONSTANTS, ROUNDS
+from src.mimc7_witness import Mimc7ColumnarWitness
 
 MAX_LEVELS = 100
 
+# each hash takes a first step, a step for every other round and a last step
+STEPS_PER_HASH = ROUNDS + 2 - 1
+
+# the packed layout computes several rounds per step, the last one also outputs the hash
+ROUNDS_PER_STEP = 7
+PACKED_STEPS_PER_HASH = ROUNDS // ROUNDS_PER_STEP
+
+MIMC7_LAYOUT_ROUNDS = "rounds"
+MIMC7_LAYOUT_PACKED = "packed"
+
+# precompiled sizes of the Mimc7MultiCircuit, in number of hashes
+SIZE_CLASSES = (8, 16, 32, 64, 128, 256, 512)
+
+
+def size_class(num_hashes):
+    """
+    returns the smallest size class that fits the given number of hashes
+    """
+    for size in SIZE_CLASSES:
+        if num_hashes <= size:
+            return size
+    raise ValueError(f"{num_hashes} hashes do not fit in the largest size class {SIZE_CLASSES[-1]}")
+
+
+def mimc7_num_steps(num_hashes, steps_per_hash=STEPS_PER_HASH):
+    """
+    returns the number of steps of a Mimc7MultiCircuit holding the given number of hashes,
+    the last step is always a padding one
+    """
+    return steps_per_hash * num_hashes + 1
+
+
+def mimc7_sub_circuit(super_circuit, num_hashes, layout=MIMC7_LAYOUT_ROUNDS, columnar=False):
+    """
+    adds to the super circuit the sub-circuits computing the hashes with the given layout,
+    and returns the one holding the hashes table, columnar chooses the Mimc7ColumnarWitness format
+    """
+    if layout == MIMC7_LAYOUT_ROUNDS:
+        super_circuit.mimc7_constants = super_circuit.sub_circuit(Mimc7Constants(super_circuit))
+        return super_circuit.sub_circuit(
+            Mimc7MultiCircuit(
+                super_circuit,
+                constants_table=super_circuit.mimc7_constants.lookup_table,
+                num_hashes=num_hashes,
+                columnar=columnar,
+            )
+        )
+    if layout == MIMC7_LAYOUT_PACKED:
+        return super_circuit.sub_circuit(
+            Mimc7PackedMultiCircuit(super_circuit, num_hashes=num_hashes, columnar=columnar)
+        )
+    raise ValueError(f"Unknown MIMC7 layout {layout}")
+
 
 # It's the best practice to wrap all values in F, even though the `assign` functions automatically wrap values in F.
 class Mimc7Constants(Circuit):
@@ -55,16 +110,15 @@ class Mimc7FirstStep(StepType):
             self.circuit.constants_table.apply(self.circuit.row).apply(self.c)
         )
 
-    def wg(self, i_value, x_value, k_value, c_value, row_value):
+    def wg(self, i_value, x_value, k_value, c_value, row_value, y_value):
         self.assign(self.circuit.original_input, F(i_value))
         self.assign(self.circuit.x, F(x_value))
         self.assign(self.circuit.k, F(k_value))
         self.assign(self.c, F(c_value))
         self.assign(self.circuit.row, F(row_value))
 
-        xkc_value = F(x_value + k_value + c_value)
-        self.assign(self.xkc, F(xkc_value))
-        self.assign(self.y, F(xkc_value ** 7))
+        self.assign(self.xkc, F(x_value + k_value + c_value))
+        self.assign(self.y, F(y_value))
         self.assign(self.circuit.enable_lookup, F(0))
 
 
@@ -97,16 +151,15 @@ class Mimc7Step(StepType):
             self.circuit.constants_table.apply(self.circuit.row).apply(self.c)
         )
 
-    def wg(self, i_value, x_value, k_value, c_value, row_value):
+    def wg(self, i_value, x_value, k_value, c_value, row_value, y_value):
         self.assign(self.circuit.original_input, F(i_value))
         self.assign(self.circuit.x, F(x_value))
         self.assign(self.circuit.k, F(k_value))
         self.assign(self.c, F(c_value))
         self.assign(self.circuit.row, F(row_value))
 
-        xkc_value = F(x_value + k_value + c_value)
-        self.assign(self.xkc, F(xkc_value))
-        self.assign(self.y, F(xkc_value ** 7))
+        self.assign(self.xkc, F(x_value + k_value + c_value))
+        self.assign(self.y, F(y_value))
         self.assign(self.circuit.enable_lookup, F(0))
 
 
@@ -115,25 +168,41 @@ class Mimc7LastStep(StepType):
         self.constr(eq(self.circuit.x + self.circuit.k, self.circuit.out))
         self.constr(eq(self.circuit.enable_lookup, 1))
 
-    def wg(self, i_value, x_value, k_value, _, row_value):
+    def wg(self, i_value, x_value, k_value, _, row_value, out_value):
         self.assign(self.circuit.original_input, F(i_value))
         self.assign(self.circuit.x, F(x_value))
         self.assign(self.circuit.k, F(k_value))
         self.assign(self.circuit.row, F(row_value))
-        self.assign(self.circuit.out, F(x_value + k_value))
+        self.assign(self.circuit.out, F(out_value))
         self.assign(self.circuit.enable_lookup, F(1))
 
 
 class Mimc7Padding(StepType):
     def setup(self):
         self.constr(eq(self.circuit.enable_lookup, F(0)))
+        self.constr(eq(self.circuit.row, 0))
+        # only a new hash, or more padding, can follow the padding
+        self.transition(eq(self.circuit.row.next(), 0))
 
     def wg(self):
         self.assign(self.circuit.enable_lookup, F(0))
+        self.assign(self.circuit.row, F(0))
 
 
 # It's the best practice to wrap all values in F, even though the `assign` functions automatically wrap values in F.
 class Mimc7MultiCircuit(Circuit):
+    # maximum number of hashes, can be set with the `num_hashes` argument of the constructor
+    num_hashes = MAX_LEVELS
+    steps_per_hash = STEPS_PER_HASH
+    # keep the witness as a Mimc7ColumnarWitness, can be set with the `columnar` argument of the constructor
+    columnar = False
+    # repeated inputs skipped by the last trace, the steps that saved, and the steps of the witness
+    skipped_hashes = 0
+    rows_saved = 0
+    real_steps = 0
+    padding_steps = 0
+    _padding_instance = None
+
     def setup(self):
         # defines signals
         self.x = self.forward("x")
@@ -152,7 +221,7 @@ class Mimc7MultiCircuit(Circuit):
         # define circuit constraints
         self.pragma_first_step(self.mimc7_first_step)
         self.pragma_last_step(self.mimc7_padding)
-        self.pragma_num_steps((ROUNDS + 2 - 1) * MAX_LEVELS)
+        self.pragma_num_steps(mimc7_num_steps(self.num_hashes, self.steps_per_hash))
 
         # define lookup table to store the hashes and the inputs that generate them
         self.hashes_table = self.new_table(
@@ -162,46 +231,213 @@ class Mimc7MultiCircuit(Circuit):
             .add(self.out)
         )
 
-    def trace(self, x_values, k_value):
-        # compute hashes for every input
-        for x_value in x_values:
-            self.trace_single(x_value, k_value)
-        # fill with padding
-        while self.needs_padding():
-            self.add(self.mimc7_padding)
+    def gen_witness(self, x_values, k_value, traces=None):
+        if not self.columnar:
+            return super().gen_witness(x_values, k_value, traces)
+        return Mimc7ColumnarWitness.from_traces(self, self.unique_traces(x_values, k_value, traces))
+
+    def trace(self, x_values, k_value, traces=None):
+        for recorded in self.unique_traces(x_values, k_value, traces):
+            self.trace_single(recorded.x_in, k_value, recorded)
+        # fill with padding, all the padding steps are the same instance
+        self.witness.step_instances.extend([self.padding_instance()] * self.padding_steps)
 
-    def trace_single(self, x_in_value, k_value):
+    def padding_instance(self):
         """
-        performs the hash logic, and adds all the necessary steps of a single compute
+        returns the step instance of the padding, it assigns constants only so it's built once per circuit
         """
-        c_value = F(ROUND_CONSTANTS[0])
-        i_value = F(x_in_value)
-        x_value = F(x_in_value)
-        row_value = F(0)
+        if self._padding_instance is None:
+            self._padding_instance = self.mimc7_padding.gen_step_instance()
+        return self._padding_instance
 
-        self.add(self.mimc7_first_step, i_value, x_value, k_value, c_value, row_value)
+    def stream(self, x_values, k_value, traces=None, chunk_size=None):
+        """
+        generator of the step instances of the witness, built only as they are consumed, or of lists of
+        chunk_size of them. The padding steps come last, as the padding instance, and are only yielded on demand.
+        """
+        step_instances = self._stream(x_values, k_value, traces)
+        if chunk_size is None:
+            yield from step_instances
+            return
+
+        chunk = []
+        for step_instance in step_instances:
+            chunk.append(step_instance)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _stream(self, x_values, k_value, traces):
+        # the traces are only field elements, the bulk of the witness is in the step instances
+        for recorded in self.unique_traces(x_values, k_value, traces):
+            for step_type, args in self.hash_steps(recorded):
+                yield step_type.gen_step_instance(*args)
+
+        padding = self.padding_instance()
+        for _ in range(0, self.padding_steps):
+            yield padding
+
+    def unique_traces(self, x_values, k_value, traces=None):
+        """
+        returns the traces of the hashes to add to the table, keeping the statistics of the witness
+        """
+        # compute hashes for every input, unless they were already computed by the caller
+        if traces is None:
+            traces = mimc7_batch_traces(x_values, k_value)
 
-        for i in range(1, ROUNDS):
-            row_value += F(1)
-            x_value += F(k_value + c_value)
-            x_value = F(x_value ** 7)
-            c_value = F(ROUND_CONSTANTS[i])
+        # the lookups only need every input once in the table, repeated ones are skipped
+        unique_traces = {}
+        for recorded in traces:
+            unique_traces.setdefault(recorded.x_in, recorded)
 
-            self.add(self.mimc7_step, i_value, x_value, k_value, c_value, row_value)
+        if len(unique_traces) > self.num_hashes:
+            raise ValueError(f"{len(unique_traces)} hashes do not fit in a circuit of {self.num_hashes} hashes")
 
-        row_value += F(1)
-        x_value += F(k_value + c_value)
-        x_value = F(x_value ** 7)
+        self.skipped_hashes = len(traces) - len(unique_traces)
+        self.rows_saved = self.skipped_hashes * self.steps_per_hash
+        self.real_steps = len(unique_traces) * self.steps_per_hash
+        self.padding_steps = mimc7_num_steps(self.num_hashes, self.steps_per_hash) - self.real_steps
 
-        self.add(self.mimc7_last_step, i_value, x_value, k_value, c_value, row_value)
+        return list(unique_traces.values())
 
+    def trace_single(self, x_in_value, k_value, recorded=None):
+        """
+        adds all the necessary steps of a single compute, replaying the recorded rounds of the hash
+        """
+        if recorded is None:
+            recorded = mimc7_trace(x_in_value, k_value)
+        for step_type, args in self.hash_steps(recorded):
+            self.add(step_type, *args)
+
+    def hash_steps(self, recorded):
+        """
+        generator of the (step type, wg arguments) of every step of a hash, replaying its recorded rounds
+        """
+        rounds = recorded.rounds
+        i_value = recorded.x_in
+
+        # every round step also assigns its output, which is the input of the next row
+        yield self.mimc7_first_step, (i_value, *rounds[0], rounds[1][0])
+
+        for row in range(1, ROUNDS):
+            yield self.mimc7_step, (i_value, *rounds[row], rounds[row + 1][0])
+
+        yield self.mimc7_last_step, (i_value, *rounds[ROUNDS], recorded.out)
+
+
+class Mimc7PackedStep(StepType):
+    """
+    computes ROUNDS_PER_STEP consecutive rounds, with their round constants inlined in the constraints
+    """
+
+    def __init__(self, circuit, step_type_name, first_round):
+        self.first_round = first_round
+        self.last = first_round + ROUNDS_PER_STEP == ROUNDS
+        super().__init__(circuit, step_type_name)
+
+    def setup(self):
+        self.y = [self.internal(f"y{i}") for i in range(0, ROUNDS_PER_STEP)]
+
+        # the row binds every step type to its position in the hash
+        self.constr(eq(self.circuit.row, self.first_round // ROUNDS_PER_STEP))
+        if self.first_round == 0:
+            self.constr(eq(self.circuit.original_input, self.circuit.x))
+
+        x = self.circuit.x
+        for i, y in enumerate(self.y):
+            xkc = x + self.circuit.k + F(ROUND_CONSTANTS[self.first_round + i])
+            self.constr(eq(xkc * xkc * xkc * xkc * xkc * xkc * xkc, y))
+            x = y
+
+        if self.last:
+            self.constr(eq(x + self.circuit.k, self.circuit.out))
+            self.constr(eq(self.circuit.enable_lookup, 1))
+            # the next hash starts from its first step, so every step of a hash follows the previous one
+            # back to the first step, which binds original_input to the hashed input
+            self.transition(eq(self.circuit.row.next(), 0))
+        else:
+            self.constr(eq(self.circuit.enable_lookup, 0))
+            self.transition(eq(x, self.circuit.x.next()))
+            self.transition(eq(self.circuit.k, self.circuit.k.next()))
+            self.transition(eq(self.circuit.original_input, self.circuit.original_input.next()))
+            self.transition(eq(self.circuit.row + 1, self.circuit.row.next()))
+
+    def wg(self, i_value, x_value, k_value, row_value, y_values, out_value):
+        self.assign(self.circuit.original_input, F(i_value))
+        self.assign(self.circuit.x, F(x_value))
+        self.assign(self.circuit.k, F(k_value))
+        self.assign(self.circuit.row, F(row_value))
+
+        for y, y_value in zip(self.y, y_values):
+            self.assign(y, F(y_value))
+
+        if self.last:
+            self.assign(self.circuit.out, F(out_value))
+            self.assign(self.circuit.enable_lookup, F(1))
+        else:
+            self.assign(self.circuit.enable_lookup, F(0))
+
+
+class Mimc7PackedMultiCircuit(Mimc7MultiCircuit):
+    """
+    same hashes table as Mimc7MultiCircuit, computing ROUNDS_PER_STEP rounds per step,
+    so it doesn't need the Mimc7Constants lookups
+    """
+    steps_per_hash = PACKED_STEPS_PER_HASH
 
-class Mimc7MultiSuperCircuit(SuperCircuit):
     def setup(self):
-        self.mimc7_constants = self.sub_circuit(Mimc7Constants(self))
-        self.mimc7_multi_circuit = self.sub_circuit(
-            Mimc7MultiCircuit(self, constants_table=self.mimc7_constants.lookup_table)
+        # defines signals
+        self.x = self.forward("x")
+        self.k = self.forward("k")
+        self.row = self.forward("row")
+        self.out = self.forward("out")
+        self.enable_lookup = self.forward("enable_lookup")
+        self.original_input = self.forward("original_input")
+
+        # define necessary step types, one for every group of rounds
+        self.mimc7_packed_steps = [
+            self.step_type(Mimc7PackedStep(self, f"mimc7_packed_step_{j}", j * ROUNDS_PER_STEP))
+            for j in range(0, PACKED_STEPS_PER_HASH)
+        ]
+        self.mimc7_padding = self.step_type(Mimc7Padding(self, "mimc7_padding"))
+
+        # define circuit constraints
+        self.pragma_first_step(self.mimc7_packed_steps[0])
+        self.pragma_last_step(self.mimc7_padding)
+        self.pragma_num_steps(mimc7_num_steps(self.num_hashes, self.steps_per_hash))
+
+        # define lookup table to store the hashes and the inputs that generate them
+        self.hashes_table = self.new_table(
+            table()
+            .add(self.enable_lookup)
+            .add(self.original_input)
+            .add(self.out)
         )
 
+    def hash_steps(self, recorded):
+        """
+        generator of the (step type, wg arguments) of the packed steps of a hash, replaying its recorded rounds
+        """
+        rounds = recorded.rounds
+
+        for row, step in enumerate(self.mimc7_packed_steps):
+            first_round = row * ROUNDS_PER_STEP
+            x_value, k, _, _ = rounds[first_round]
+            y_values = [rounds[first_round + i + 1][0] for i in range(0, ROUNDS_PER_STEP)]
+            yield step, (recorded.x_in, x_value, k, row, y_values, recorded.out)
+
+
+class Mimc7MultiSuperCircuit(SuperCircuit):
+    def __init__(self, num_hashes=MAX_LEVELS, layout=MIMC7_LAYOUT_ROUNDS, columnar=False):
+        self.num_hashes = num_hashes
+        self.layout = layout
+        self.columnar = columnar
+        super().__init__()
+
+    def setup(self):
+        self.mimc7_multi_circuit = mimc7_sub_circuit(self, self.num_hashes, self.layout, self.columnar)
+
     def mapping(self, x_values, k_value):
         self.map(self.mimc7_multi_circuit, x_values, k_value)
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from chiquito.wit_gen import TraceWitness
+
+from src.mimc7 import Mimc7Trace
+from src.mimc7_constants import ROUND_CONSTANTS, ROUNDS
+
+# states of a hash: its input and the output of every round
+STATES_PER_HASH = ROUNDS + 1
+
+
+class Mimc7ColumnarWitness:
+    """
+    witness of a Mimc7MultiCircuit kept as one list of field elements per signal:
+    `original_input`, `k` and `out` hold one entry per hash, and `x` the state of every row of every hash.
+    The round constants and rows follow from the position of the state, and the trailing padding steps
+    are only a count. The step instances the backend expects are built only at the boundary,
+    by `get_witness_json` or `step_instances`.
+    """
+
+    def __init__(self, circuit, columns, padding):
+        self.circuit = circuit
+        self.columns = columns
+        # number of padding steps after the hashes
+        self.padding = padding
+
+    @classmethod
+    def from_traces(cls, circuit, traces):
+        columns = {
+            "original_input": [recorded.x_in for recorded in traces],
+            "k": [recorded.k for recorded in traces],
+            "out": [recorded.out for recorded in traces],
+            "x": [x for recorded in traces for x, _, _, _ in recorded.rounds],
+        }
+        return cls(circuit, columns, circuit.padding_steps)
+
+    @property
+    def num_hashes(self):
+        return len(self.columns["out"])
+
+    def traces(self):
+        """
+        returns the MIMC7 traces of the hashes, rebuilt from the columns
+        """
+        traces = []
+        for h, (x_in, k, out) in enumerate(zip(self.columns["original_input"], self.columns["k"], self.columns["out"])):
+            states = self.columns["x"][h * STATES_PER_HASH:(h + 1) * STATES_PER_HASH]
+            rounds = tuple((x, k, ROUND_CONSTANTS[min(row, ROUNDS - 1)], row) for row, x in enumerate(states))
+            traces.append(Mimc7Trace(x_in, k, rounds, out))
+        return traces
+
+    def to_trace_witness(self):
+        """
+        returns the witness in the format of the backend, built on every call without touching the circuit,
+        so only the columns are kept once it's proven
+        """
+        step_instances = [
+            step_type.gen_step_instance(*args)
+            for recorded in self.traces()
+            for step_type, args in self.circuit.hash_steps(recorded)
+        ]
+        step_instances.extend([self.circuit.padding_instance()] * self.padding)
+        return TraceWitness(step_instances)
+
+    @property
+    def step_instances(self):
+        return self.to_trace_witness().step_instances
+
+    def get_witness_json(self):
+        return self.to_trace_witness().get_witness_json()
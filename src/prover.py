@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import local
+from typing import NamedTuple, Optional
+
+from src.semaphore import SemaphoreSuperCircuit
+
+# compiled super circuits of every thread, they keep the witness being generated so threads can't share them
+_COMPILED = local()
+
+# prover of the current worker process, see prove_batch
+_worker_prover = None
+
+
+class ProofResult(NamedTuple):
+    """
+    outcome of one proof of a batch, error describes the failure if the proof didn't succeed
+    """
+    error: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def compiled_circuit(super_circuit_class, **kwargs):
+    """
+    returns the super circuit of the given class and constructor arguments, setting it up only the first time
+    in the current thread. The setup builds the sub-circuits ASTs, the fixed assignments of the constants table,
+    and hands them to the backend, so it's the part worth doing once per thread.
+    """
+    # the arguments left to their defaults give the same circuit as when they are passed
+    arguments = inspect.signature(super_circuit_class).bind(**kwargs)
+    arguments.apply_defaults()
+    key = (super_circuit_class, tuple(sorted(arguments.arguments.items())))
+
+    compiled = getattr(_COMPILED, "circuits", None)
+    if compiled is None:
+        compiled = _COMPILED.circuits = {}
+    if key not in compiled:
+        compiled[key] = super_circuit_class(**kwargs)
+    return compiled[key]
+
+
+def depth_for_size(num_leaves):
+    """
+    returns the depth of the smallest tree holding the given number of leaves
+    """
+    return max(1, (num_leaves - 1).bit_length())
+
+
+def circuit_for_depth(super_circuit_class, n_levels, **kwargs):
+    """
+    returns the compiled super circuit for trees of the given depth, there's one per depth and arguments
+    """
+    return compiled_circuit(super_circuit_class, n_levels=n_levels, **kwargs)
+
+
+class Prover:
+    """
+    long-lived prover, keeping a compiled super circuit and running only the witness dependent work per proof.
+    The super circuit keeps the witness being generated, so a prover must not be shared between threads,
+    the provers built in different threads have their own super circuits.
+    """
+
+    def __init__(self, super_circuit_class=SemaphoreSuperCircuit, **kwargs):
+        self.super_circuit = compiled_circuit(super_circuit_class, **kwargs)
+
+    def gen_witness(self, *args):
+        return self.super_circuit.gen_witness(*args)
+
+    def verify(self, super_witness):
+        """
+        runs the mock prover over a witness generated by this prover, raises if the proof fails
+        """
+        self.super_circuit.halo2_mock_prover(super_witness)
+
+    def prove(self, *args):
+        """
+        generates the witness of the given mapping arguments and proves it
+        """
+        self.verify(self.gen_witness(*args))
+
+
+def prove_batch(inputs, workers=None, super_circuit_class=SemaphoreSuperCircuit, **kwargs):
+    """
+    proves many independent inputs, each one the tuple of arguments of the super circuit mapping,
+    over a pool of processes that keep a compiled super circuit each.
+    Returns the results in the order of the inputs, a failing input doesn't fail the rest of the batch.
+    The workers don't cache identities, see _init_worker.
+    """
+    with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(super_circuit_class, kwargs),
+    ) as executor:
+        futures = [executor.submit(_prove_in_worker, tuple(args)) for args in inputs]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # the worker couldn't run the proof at all, e.g. it died or the input couldn't be sent to it
+                results.append(ProofResult(repr(e)))
+        return results
+
+
+class AsyncProver:
+    """
+    asyncio front-end of a pool of processes keeping a compiled super circuit each, so the proofs don't block
+    the event loop. At most `max_pending` proofs are queued in or running on the pool, further calls of `prove`
+    wait for a slot, which is the backpressure, and their timeout includes that wait. A timeout or a cancellation
+    drops the proof if it didn't start, a proof already running on a worker finishes there and holds its slot until then.
+    The workers don't cache identities, so purging IDENTITY_CACHE in the service process leaves no copy of them.
+    """
+
+    def __init__(self, workers=None, max_pending=64, timeout=None, super_circuit_class=SemaphoreSuperCircuit, **kwargs):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.pending = 0
+        self._slots = asyncio.Semaphore(max_pending)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(super_circuit_class, kwargs),
+        )
+
+    @property
+    def full(self):
+        """
+        whether a new proof would wait for a slot, e.g. to answer a request with a retry later
+        """
+        return self.pending >= self.max_pending
+
+    async def start(self):
+        """
+        starts the workers, which compile their super circuit, so the first proofs don't pay for it
+        """
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[
+            loop.run_in_executor(self._executor, _worker_ready) for _ in range(0, self.workers)
+        ])
+
+    async def prove(self, *args, timeout=None):
+        """
+        proves the given mapping arguments on the pool, returns a ProofResult,
+        raises TimeoutError if waiting for a slot and proving take longer than the timeout,
+        by default the one of the prover
+        """
+        if timeout is None:
+            timeout = self.timeout
+
+        loop = asyncio.get_running_loop()
+        # a single deadline for the wait for a slot and the proof
+        async with asyncio.timeout(timeout):
+            await self._slots.acquire()
+            self.pending += 1
+            try:
+                future = self._executor.submit(_prove_in_worker, args)
+            except Exception:
+                self._release()
+                raise
+            # the slot is held until the worker is done, or the proof is dropped before starting
+            future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+
+            try:
+                # cancelling the wrapper also cancels the proof if it's still queued
+                return await asyncio.wrap_future(future)
+            except Exception as e:
+                # the worker couldn't run the proof at all, e.g. it died or the input couldn't be sent to it
+                return ProofResult(repr(e))
+
+    def _release(self):
+        self.pending -= 1
+        self._slots.release()
+
+    async def close(self):
+        """
+        drops the queued proofs and waits for the running ones to finish
+        """
+        await asyncio.get_running_loop().run_in_executor(
+            None,
+            lambda: self._executor.shutdown(wait=True, cancel_futures=True),
+        )
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+
+def _init_worker(super_circuit_class, kwargs):
+    global _worker_prover
+    _worker_prover = Prover(super_circuit_class, **kwargs)
+    # the identity cache is per process, a purge in the service process wouldn't reach the copies of the workers,
+    # so they compute the identity hashes of every proof instead of keeping them
+    if getattr(_worker_prover.super_circuit, "identity_cache", None) is not None:
+        _worker_prover.super_circuit.identity_cache = None
+
+
+def _worker_ready():
+    return os.getpid()
+
+
+def _prove_in_worker(args):
+    try:
+        _worker_prover.prove(*args)
+    except Exception as e:
+        return ProofResult(repr(e))
+    return ProofResult()
@@ -1,23 +1,55 @@
 from __future__ import annotations
 
+from typing import NamedTuple
+
 from chiquito.cb import eq
-from chiquito.chiquito_ast import Last
+from chiquito.chiquito_ast import Last, Step
 from chiquito.dsl import SuperCircuit, Circuit, StepType
 from chiquito.util import F
 
-from src.mimc7_constants import ROUND_CONSTANTS
-from src.mimc7_multi import ROUNDS, Mimc7Constants, Mimc7MultiCircuit
-from src.inclusion_proof import MtipCircuit
+from src.identity_cache import IDENTITY_CACHE
+from src.instrumentation import Instrumented
+from src.mimc7 import mimc7, mimc7_hash, mimc7_trace
+from src.mimc7_multi import MIMC7_LAYOUT_ROUNDS, mimc7_sub_circuit, size_class
+from src.inclusion_proof import N_LEVELS, MtipCircuit, level_input
+
+# MIMC7 key of every hash
+K_VALUE = 10
+
+# hashes computed besides the tree levels and the nullifier hash of every signal: secret and commitment
+NUM_IDENTITY_HASHES = 2
+
+
+class SemaphoreHashes(NamedTuple):
+    """
+    hashes computed by the mapping: the inputs of every hash and their MIMC7 traces,
+    the identity ones first, then the nullifiers and the tree levels, and the hashes of the tree path
+    """
+    x_values: list
+    traces: list
+    secret: F
+    commitment: F
+    nullifier_hashes: list
+    hashes: list
+    num_identity_hashes: int
 
-N_LEVELS = 20
+
+class SemaphoreOutputs(NamedTuple):
+    """
+    public values of a proof, as computed by SemaphoreSuperCircuit.evaluate
+    """
+    root: F
+    nullifier_hash: F
+    commitment: F
+    signal: F
 
 
 class SemaphoreStep(StepType):
     def setup(self):
-        # define internal signals
-        self.secret_input = self.internal("secret_input")
-        self.secret = self.internal("secret")
-        self.commitment = self.internal("commitment")
+        # define internal signals, the ones of the identity are forward signals of the circuit
+        self.secret_input = self.circuit.secret_input
+        self.secret = self.circuit.secret
+        self.commitment = self.circuit.commitment
         self.nullifier_input = self.internal("nullifier_input")
         self.nullifier_hash = self.internal("nullifier_hash")
         self.signal_squared = self.internal("signal_squared")
@@ -25,6 +57,11 @@ class SemaphoreStep(StepType):
         # constraints the signal squared the signal
         self.constr(eq(self.signal_squared, self.circuit.signal * self.circuit.signal))
 
+        # all the signals are of the same identity
+        self.transition(eq(self.secret_input, self.secret_input.next()))
+        self.transition(eq(self.secret, self.secret.next()))
+        self.transition(eq(self.commitment, self.commitment.next()))
+
         # add lookup table constraints to verify that used hashes are valid
         self.add_lookup(
             self.circuit.hashes_table
@@ -69,18 +106,26 @@ class SemaphoreStep(StepType):
 
 
 class SemaphoreCircuit(Circuit):
+    # number of signals, can be set with the `num_signals` argument of the constructor
+    num_signals = 1
+
     def setup(self):
         # define circuit signals
         self.signal = self.forward("signal")
+        self.secret_input = self.forward("secret_input")
+        self.secret = self.forward("secret")
+        self.commitment = self.forward("commitment")
 
         # define necessary step types
         self.step = self.step_type(SemaphoreStep(self, "semaphore_step"))
 
         # define circuit constraints
         self.pragma_first_step(self.step)
-        self.pragma_num_steps(1)
+        self.pragma_num_steps(self.num_signals)
 
-        # define exposed signals
+        # define exposed signals, one for every step
+        for offset in range(0, self.num_signals - 1):
+            self.expose(self.signal, Step(offset))
         self.expose(self.signal, Last())
 
     def trace(
@@ -103,89 +148,216 @@ class SemaphoreCircuit(Circuit):
             secret,
             commitment
         )
-        
 
-class SemaphoreSuperCircuit(SuperCircuit):
+
+class SemaphoreMultiCircuit(SemaphoreCircuit):
+    def trace(self, identity_nullifier, identity_trapdoor, signals, secret, commitment):
+        # add a step for every (external_nullifier, nullifier_hash, signal_hash), all of them of the same identity
+        for external_nullifier, nullifier_hash, signal_hash in signals:
+            self.add(
+                self.step,
+                identity_nullifier,
+                identity_trapdoor,
+                external_nullifier,
+                nullifier_hash,
+                signal_hash,
+                secret,
+                commitment
+            )
+
+
+class SemaphoreSuperCircuit(Instrumented, SuperCircuit):
+    num_signals = 1
+    semaphore_circuit_class = SemaphoreCircuit
+    # cache of the secret and commitment of the identities, None to compute them on every mapping
+    identity_cache = IDENTITY_CACHE
+
+    def __init__(self, n_levels=N_LEVELS, layout=MIMC7_LAYOUT_ROUNDS, columnar=False):
+        self.n_levels = n_levels
+        self.layout = layout
+        self.columnar = columnar
+        super().__init__()
+
     def setup(self):
-        # define MIMC7 constants sub-circuit
-        self.mimc7_constants = self.sub_circuit(Mimc7Constants(self))
-        # define MIMC7 Multi sub-circuit
-        self.mimc7_multi_circuit = self.sub_circuit(
-            Mimc7MultiCircuit(self, constants_table=self.mimc7_constants.lookup_table)
+        # define MIMC7 sub-circuits with the chosen layout
+        self.mimc7_multi_circuit = mimc7_sub_circuit(
+            self,
+            size_class(self.n_levels + NUM_IDENTITY_HASHES + self.num_signals),
+            self.layout,
+            self.columnar,
         )
         # define Merkle Tree Inclusion Proof Multi sub-circuit
         self.mtip_circuit = self.sub_circuit(
-            MtipCircuit(self, hashes_table=self.mimc7_multi_circuit.hashes_table)
+            MtipCircuit(
+                self,
+                hashes_table=self.mimc7_multi_circuit.hashes_table,
+                n_levels=self.n_levels,
+            )
         )
         # define Semaphore circuit
         self.semaphore_circuit = self.sub_circuit(
-            SemaphoreCircuit(self, hashes_table=self.mimc7_multi_circuit.hashes_table)
+            self.semaphore_circuit_class(
+                self,
+                hashes_table=self.mimc7_multi_circuit.hashes_table,
+                num_signals=self.num_signals,
+            )
         )
 
     def mapping(self, identity_nullifier, identity_trapdoor, siblings, path_indices, signal_hash, external_nullifier):
-        k_value = 10
+        secret, commitment, nullifier_hashes = self.map_hashes(
+            identity_nullifier,
+            identity_trapdoor,
+            siblings,
+            path_indices,
+            [external_nullifier],
+        )
+
+        # next circuit constraints that the computed hashes for the signal and commitment
+        # are correctly used
+        self.map(
+            self.semaphore_circuit,
+            identity_nullifier,
+            identity_trapdoor,
+            external_nullifier,
+            nullifier_hashes[0],
+            signal_hash,
+            secret,
+            commitment,
+        )
 
-        # compute hashes from input values
-        secret = self.mimc7(identity_nullifier + identity_trapdoor, k_value)
-        commitment = self.mimc7(secret, k_value)
-        nullifier_hash = self.mimc7(identity_nullifier + external_nullifier, k_value)
+    def map_hashes(self, identity_nullifier, identity_trapdoor, siblings, path_indices, external_nullifiers):
+        """
+        computes the hashes of the identity, its nullifiers and its tree path, and maps the MIMC7 and MTIP circuits,
+        returns the secret, the commitment and the nullifier hash of every external nullifier
+        """
+        computed = self.compute_hashes(
+            identity_nullifier,
+            identity_trapdoor,
+            siblings,
+            path_indices,
+            external_nullifiers,
+        )
 
-        # initialize hashes array with leaf element
-        leaf = commitment
-        hashes = [leaf]
+        # this first circuit will store all the hashes on a lookup table, replaying the rounds
+        # recorded above, that will allow the next circuit to add lookup constraints to verify that
+        # the given values are correct by checking their existence on the table.
+        self.map(self.mimc7_multi_circuit, computed.x_values, K_VALUE, computed.traces)
+
+        # next circuit constraints the given hashes to exist on the lookup table,
+        # that protects the MTIP circuit from using crafted hashes
+        self.map(
+            self.mtip_circuit,
+            path_indices,
+            computed.x_values[computed.num_identity_hashes:],
+            computed.hashes,
+        )
+
+        return computed.secret, computed.commitment, computed.nullifier_hashes
+
+    def compute_hashes(self, identity_nullifier, identity_trapdoor, siblings, path_indices, external_nullifiers):
+        """
+        computes the hashes of the identity, its nullifiers and its tree path, without mapping any circuit
+        """
+        k_value = K_VALUE
+
+        # compute hashes from input values, recording their rounds to be replayed by the MIMC7 circuit,
+        # the ones of the identity are the same for all its signals
+        if self.identity_cache is None:
+            traces = [mimc7_trace(identity_nullifier + identity_trapdoor, k_value)]
+            traces.append(mimc7_trace(traces[0].out, k_value))
+        else:
+            identity = self.identity_cache.identity(identity_nullifier, identity_trapdoor, k_value)
+            traces = [identity.secret_trace, identity.commitment_trace]
+        secret = F(traces[0].out)
+        commitment = F(traces[1].out)
 
         # add input values of computed hashes
         # this will allow us to constrain the values by checking a lookup table
         x_values = [
             identity_nullifier + identity_trapdoor,
             secret,
-            identity_nullifier + external_nullifier
         ]
 
-        for i in range(0, N_LEVELS):
+        # every signal only adds the hash of its nullifier
+        nullifier_hashes = []
+        for external_nullifier in external_nullifiers:
+            x_values.append(identity_nullifier + external_nullifier)
+            traces.append(mimc7_trace(x_values[-1], k_value))
+            nullifier_hashes.append(F(traces[-1].out))
+
+        # initialize hashes array with leaf element
+        leaf = commitment
+        hashes = [leaf]
+        num_identity_hashes = len(x_values)
+
+        for i in range(0, self.n_levels):
             # compute the MIMC7 hash of this level
-            input_1 = ((siblings[i] - hashes[i]) * path_indices[i]) + hashes[i]
-            input_2 = ((hashes[i] - siblings[i]) * path_indices[i]) + siblings[i]
-            x_values.append(input_1 + input_2)
-            result = self.mimc7(x_values[i], k_value)
+            x_values.append(level_input(hashes[i], siblings[i], path_indices[i]))
+            traces.append(mimc7_trace(x_values[-1], k_value))
             # append the hash to the list
-            hashes.append(result)
+            hashes.append(F(traces[-1].out))
 
-        # this first circuit will compute and store all the hashes on a lookup table,
-        # that will allow the next circuit to add lookup constraints to verify that the given
-        # values are correct by checking their existence on the table.
-        self.map(self.mimc7_multi_circuit, x_values, k_value)
+        return SemaphoreHashes(x_values, traces, secret, commitment, nullifier_hashes, hashes, num_identity_hashes)
 
-        # next circuit constraints the given hashes to exist on the lookup table,
-        # that protects the MTIP circuit from using crafted hashes
-        self.map(self.mtip_circuit, path_indices, x_values, hashes)
+    def evaluate(self, identity_nullifier, identity_trapdoor, siblings, path_indices, signal_hash, external_nullifier):
+        """
+        returns the public values of the proof of the mapping arguments, computing their hashes only,
+        to check the inputs before generating the witness and proving it
+        """
+        k_value = K_VALUE
 
-        # next circuit constraints that the computed hashes for the signal and commitment
+        # only the values of the hashes are needed, they are computed without recording their rounds
+        # nor going through the identity and MIMC7 traces caches
+        secret = F(mimc7_hash(identity_nullifier + identity_trapdoor, k_value))
+        commitment = F(mimc7_hash(secret, k_value))
+        nullifier_hash = F(mimc7_hash(identity_nullifier + external_nullifier, k_value))
+
+        root = commitment
+        for i in range(0, self.n_levels):
+            root = F(mimc7_hash(level_input(root, siblings[i], path_indices[i]), k_value))
+
+        return SemaphoreOutputs(root, nullifier_hash, commitment, F(signal_hash))
+
+    def mimc7(self, x_in_value, k_value):
+        return F(mimc7(x_in_value, k_value))
+
+
+class SemaphoreMultiSuperCircuit(SemaphoreSuperCircuit):
+    """
+    proves many signals of the same identity, sharing its secret, commitment and tree path hashes
+    """
+    semaphore_circuit_class = SemaphoreMultiCircuit
+
+    def __init__(self, num_signals, n_levels=N_LEVELS, layout=MIMC7_LAYOUT_ROUNDS, columnar=False):
+        self.num_signals = num_signals
+        super().__init__(n_levels, layout, columnar)
+
+    def mapping(self, identity_nullifier, identity_trapdoor, siblings, path_indices, signals):
+        """
+        signals holds a (signal_hash, external_nullifier) pair for each of the num_signals signals
+        """
+        if len(signals) != self.num_signals:
+            raise ValueError(f"Expected {self.num_signals} signals, got {len(signals)}")
+
+        external_nullifiers = [external_nullifier for _, external_nullifier in signals]
+        secret, commitment, nullifier_hashes = self.map_hashes(
+            identity_nullifier,
+            identity_trapdoor,
+            siblings,
+            path_indices,
+            external_nullifiers,
+        )
+
+        # next circuit constraints that the computed hashes for every signal and the commitment
         # are correctly used
         self.map(
             self.semaphore_circuit,
             identity_nullifier,
             identity_trapdoor,
-            external_nullifier,
-            nullifier_hash,
-            signal_hash,
+            [
+                (external_nullifier, nullifier_hash, signal_hash)
+                for (signal_hash, external_nullifier), nullifier_hash in zip(signals, nullifier_hashes)
+            ],
             secret,
             commitment,
         )
-
-    def mimc7(self, x_in_value, k_value):
-        c_value = F(ROUND_CONSTANTS[0])
-        x_value = F(x_in_value)
-        row_value = F(0)
-
-        for i in range(1, ROUNDS):
-            row_value += F(1)
-            x_value += F(k_value + c_value)
-            x_value = F(x_value ** 7)
-            c_value = F(ROUND_CONSTANTS[i])
-
-        row_value += F(1)
-        x_value += F(k_value + c_value)
-        x_value = F(x_value ** 7)
-
-        return x_value + k_value
@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import mmap
+import struct
+
+from chiquito.query import Forward, Internal
+from chiquito.util import F
+from chiquito.wit_gen import StepInstance, TraceWitness
+
+from src.mimc7_constants import FIELD_MODULUS
+
+# every field element is stored as a 32 bytes little endian value
+ELEMENT_SIZE = 32
+
+# magic, version and number of witnesses, followed by the name of the super circuit
+FILE_HEADER = struct.Struct("<8sHH")
+MAGIC = b"MIMCWITN"
+VERSION = 1
+
+# position of the sub-circuit in the super circuit, stored steps, repeats of the last step and number of step types
+WITNESS_HEADER = struct.Struct("<HIIH")
+
+# number of signals and of steps of a step type
+GROUP_HEADER = struct.Struct("<HI")
+
+NAME_LENGTH = struct.Struct("<H")
+
+# index of the step type of a step
+STEP_GROUP = struct.Struct("<H")
+
+
+class StoredGroup:
+    """
+    steps of a single step type of a stored witness, with one column of ELEMENT_SIZE values per signal
+    """
+
+    def __init__(self, step_type, signals, num_steps, columns):
+        self.step_type = step_type
+        self.signals = signals
+        self.num_steps = num_steps
+        self.columns = columns
+
+    def value(self, column, row):
+        return int.from_bytes(self.columns[column][row * ELEMENT_SIZE:(row + 1) * ELEMENT_SIZE], "little")
+
+
+class StoredWitness:
+    """
+    trace witness of a sub-circuit as stored in a WitnessFile, the views point into the file buffer
+    """
+
+    def __init__(self, position, step_groups, repeats, groups):
+        self.position = position
+        # index in groups of the step type of every stored step
+        self.step_groups = step_groups
+        # the trailing steps identical to the last stored one, usually the padding, are only a count
+        self.repeats = repeats
+        self.groups = groups
+
+    @property
+    def num_steps(self):
+        return len(self.step_groups) + self.repeats
+
+
+class WitnessFile:
+    """
+    reads the witness of a super circuit from a buffer written by `witness_to_bytes`, without copying it:
+    the columns are memoryviews into the buffer, and the field elements are only parsed by `super_witness`.
+    The sub-circuits are stored by their position in the super circuit and the signals by their names,
+    so it can be loaded by another process having set up the same super circuit.
+    """
+
+    def __init__(self, buffer, close=None):
+        self.view = memoryview(buffer)
+        self._close = close
+        # views into the buffer, released by close
+        self._views = []
+        self.witnesses = []
+        try:
+            self._parse()
+        except Exception:
+            self.close()
+            raise
+
+    def _parse(self):
+        magic, version, num_witnesses = self._unpack(FILE_HEADER, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a witness file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported witness file version {version}")
+
+        offset = FILE_HEADER.size
+        self.super_circuit, offset = self._name(offset)
+
+        for _ in range(0, num_witnesses):
+            position, num_steps, repeats, num_groups = self._unpack(WITNESS_HEADER, offset)
+            offset += WITNESS_HEADER.size
+            step_groups = self._unpack(struct.Struct(f"<{num_steps}H"), offset)
+            offset += STEP_GROUP.size * num_steps
+
+            groups = []
+            for _ in range(0, num_groups):
+                num_signals, group_steps = self._unpack(GROUP_HEADER, offset)
+                offset += GROUP_HEADER.size
+                step_type, offset = self._name(offset)
+                signals = []
+                for _ in range(0, num_signals):
+                    signal, offset = self._name(offset)
+                    signals.append(signal)
+                columns = []
+                for _ in range(0, num_signals):
+                    self._check(offset, group_steps * ELEMENT_SIZE)
+                    self._views.append(self.view[offset:offset + group_steps * ELEMENT_SIZE])
+                    columns.append(self._views[-1])
+                    offset += group_steps * ELEMENT_SIZE
+                groups.append(StoredGroup(step_type, signals, group_steps, columns))
+
+            self.witnesses.append(StoredWitness(position, step_groups, repeats, groups))
+
+    def _check(self, offset, size):
+        if offset + size > len(self.view):
+            raise ValueError("Truncated witness file")
+
+    def _unpack(self, layout, offset):
+        self._check(offset, layout.size)
+        return layout.unpack_from(self.view, offset)
+
+    def _name(self, offset):
+        (length,) = self._unpack(NAME_LENGTH, offset)
+        offset += NAME_LENGTH.size
+        self._check(offset, length)
+        return str(self.view[offset:offset + length], "utf-8"), offset + length
+
+    def super_witness(self, super_circuit):
+        """
+        returns the witness in the format of gen_witness, for the given super circuit
+        """
+        if type(super_circuit).__name__ != self.super_circuit:
+            raise ValueError(f"The witness is of a {self.super_circuit}, not a {type(super_circuit).__name__}")
+
+        sub_circuit_ids = list(super_circuit.ast.sub_circuits)
+        super_witness = {}
+        for stored in self.witnesses:
+            sub_circuit_id = sub_circuit_ids[stored.position]
+            super_witness[sub_circuit_id] = self._trace_witness(super_circuit.ast.sub_circuits[sub_circuit_id], stored)
+        return super_witness
+
+    def _trace_witness(self, circuit, stored):
+        step_types = {step_type.name: step_type for step_type in circuit.step_types.values()}
+        forward_signals = {signal.annotation: Forward(signal, False) for signal in circuit.forward_signals}
+
+        # step type id and queriable of every column of every group
+        groups = []
+        for group in stored.groups:
+            if group.step_type not in step_types:
+                raise ValueError(f"Unknown step type {group.step_type}")
+            step_type = step_types[group.step_type]
+            signals = dict(forward_signals)
+            signals.update({signal.annotation: Internal(signal) for signal in step_type.signals})
+            for signal in group.signals:
+                if signal not in signals:
+                    raise ValueError(f"Unknown signal {signal} of step type {group.step_type}")
+            groups.append((step_type.id, [signals[signal] for signal in group.signals]))
+
+        step_instances = []
+        rows = [0] * len(stored.groups)
+        for g in stored.step_groups:
+            group = stored.groups[g]
+            step_type_id, queriables = groups[g]
+            row = rows[g]
+            rows[g] += 1
+            step_instances.append(
+                StepInstance(
+                    step_type_id,
+                    {queriable: F(group.value(column, row)) for column, queriable in enumerate(queriables)},
+                )
+            )
+
+        if stored.repeats:
+            step_instances.extend([step_instances[-1]] * stored.repeats)
+        return TraceWitness(step_instances)
+
+    def close(self):
+        # the views must be released before the buffer they point into
+        for view in self._views:
+            view.release()
+        self._views = []
+        self.witnesses = []
+        self.view.release()
+        if self._close is not None:
+            self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def _name_bytes(name):
+    encoded = name.encode("utf-8")
+    return NAME_LENGTH.pack(len(encoded)) + encoded
+
+
+def _element(value):
+    return (int(value) % FIELD_MODULUS).to_bytes(ELEMENT_SIZE, "little")
+
+
+def _witness_bytes(position, circuit, witness):
+    # step type and (signal, value) pairs of every step
+    steps = []
+    for step in witness.step_instances:
+        steps.append((
+            circuit.step_types[step.step_type_uuid].name,
+            tuple((str(signal), _element(value)) for signal, value in step.assignments.items()),
+        ))
+
+    # the trailing copies of the last step are stored as a count
+    stored = len(steps)
+    while stored > 1 and steps[stored - 2] == steps[-1]:
+        stored -= 1
+    repeats = len(steps) - stored
+
+    # the steps of every step type, with its signals in the order of its first step
+    groups = {}
+    step_groups = []
+    for step_type, assignments in steps[:stored]:
+        if step_type not in groups:
+            groups[step_type] = ([signal for signal, _ in assignments], [])
+        signals, rows = groups[step_type]
+        values = dict(assignments)
+        if len(values) != len(signals) or any(signal not in values for signal in signals):
+            raise ValueError(f"The steps of type {step_type} don't assign the same signals")
+        rows.append(values)
+        step_groups.append(list(groups).index(step_type))
+
+    chunks = [WITNESS_HEADER.pack(position, stored, repeats, len(groups))]
+    chunks.extend(STEP_GROUP.pack(g) for g in step_groups)
+    for step_type, (signals, rows) in groups.items():
+        chunks.append(GROUP_HEADER.pack(len(signals), len(rows)))
+        chunks.append(_name_bytes(step_type))
+        chunks.extend(_name_bytes(signal) for signal in signals)
+        # column major, all the values of a signal follow each other
+        for signal in signals:
+            chunks.extend(values[signal] for values in rows)
+    return b"".join(chunks)
+
+
+def witness_to_bytes(super_circuit, super_witness):
+    """
+    serializes the witness returned by the gen_witness of the super circuit
+    """
+    sub_circuit_ids = list(super_circuit.ast.sub_circuits)
+    chunks = [FILE_HEADER.pack(MAGIC, VERSION, len(super_witness)), _name_bytes(type(super_circuit).__name__)]
+    for sub_circuit_id, witness in super_witness.items():
+        chunks.append(
+            _witness_bytes(
+                sub_circuit_ids.index(sub_circuit_id),
+                super_circuit.ast.sub_circuits[sub_circuit_id],
+                witness,
+            )
+        )
+    return b"".join(chunks)
+
+
+def save_witness(path, super_circuit, super_witness):
+    with open(path, "wb") as file:
+        file.write(witness_to_bytes(super_circuit, super_witness))
+
+
+def load_witness(path):
+    """
+    maps the witness file in memory, the returned WitnessFile must be closed once its witness is loaded
+    """
+    with open(path, "rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return WitnessFile(buffer, buffer.close)
@@ -0,0 +1,89 @@
+import unittest
+
+from src.identity_cache import IdentityCache
+from src.mimc7 import MIMC7_CACHE, mimc7
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class IdentityCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = IdentityCache(2, 60.0, self.clock)
+
+    def test_identity(self):
+        # Act
+        identity = self.cache.identity(1, 2, 10)
+        cached = self.cache.identity(1, 2, 10)
+
+        # Assert
+        assert identity.secret == mimc7(3, 10)
+        assert identity.commitment == mimc7(identity.secret, 10)
+        assert cached is identity
+        info = self.cache.info()
+        assert (info.hits, info.misses, info.currsize) == (1, 1, 1)
+
+    def test_bounded(self):
+        # Act
+        self.cache.identity(1, 2, 10)
+        self.cache.identity(3, 4, 10)
+        self.cache.identity(1, 2, 10)
+        self.cache.identity(5, 6, 10)
+
+        # Assert
+        # the least recently used identity was evicted
+        assert self.cache.get(3, 4, 10) is None
+        assert self.cache.get(1, 2, 10) is not None
+        assert self.cache.info().currsize == 2
+
+    def test_ttl(self):
+        # Arrange
+        self.cache.identity(1, 2, 10)
+        self.clock.now = 30.0
+        self.cache.identity(3, 4, 10)
+
+        # Act
+        self.clock.now = 61.0
+        expired = self.cache.purge_expired()
+
+        # Assert
+        assert expired == 1
+        assert self.cache.get(1, 2, 10) is None
+        self.clock.now = 91.0
+        assert self.cache.get(3, 4, 10) is None
+        assert self.cache.info().expired == 2
+
+    def test_purge(self):
+        # Arrange
+        self.cache.identity(1, 2, 10)
+
+        # Act
+        purged = self.cache.purge(1, 2, 10)
+
+        # Assert
+        assert purged
+        assert not self.cache.purge(1, 2, 10)
+        assert self.cache.get(1, 2, 10) is None
+
+    def test_purge_leaves_no_traces(self):
+        # Arrange
+        MIMC7_CACHE.clear()
+        identity = self.cache.identity(11, 12, 10)
+
+        # Act
+        self.cache.purge(11, 12, 10)
+
+        # Assert
+        # neither the secret nor the identity input are in the traces cache
+        assert MIMC7_CACHE.get((23, 10)) is None
+        assert MIMC7_CACHE.get((identity.secret, 10)) is None
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,8 @@ import unittest
 
 from chiquito.util import F
 
-from src.inclusion_proof import MtipSuperCircuit
+from src.inclusion_proof import MtipBatchSuperCircuit, MtipSuperCircuit
+from src.merkle_tree import MerkleTree
 
 
 class MtipTests(unittest.TestCase):
@@ -39,6 +40,84 @@ class MtipTests(unittest.TestCase):
         except Exception:
             assert False, "Proof failed"
 
+    def test_depth(self):
+        # Arrange
+        leaf = F(1)
+        siblings = [F(1), F(2), F(3), F(4), F(5), F(6), F(7), F(8)]
+        path_indices = [F(1), F(0), F(1), F(0), F(0), F(0), F(0), F(1)]
+        k_value = F(1)
+
+        # Act
+        mtip = MtipSuperCircuit(n_levels=8)
+        mtip_witness = mtip.gen_witness(
+            leaf,
+            siblings,
+            path_indices,
+            k_value,
+        )
+
+        # Assert
+        step_instances = list(mtip_witness.values())[1].step_instances
+        assert len(step_instances) == 8
+
+        try:
+            mtip.halo2_mock_prover(mtip_witness)
+        except Exception:
+            assert False, "Proof failed"
+
+    def test_batch(self):
+        # Arrange
+        tree = MerkleTree(k_value=1)
+        for i in range(1, 10):
+            tree.insert(F(i))
+        indices = [0, 1, 8]
+        leaves = [tree.leaf(index) for index in indices]
+        proofs = [tree.proof(index) for index in indices]
+
+        # Act
+        mtip = MtipBatchSuperCircuit(num_leaves=3)
+        mtip_witness = mtip.gen_witness(
+            leaves,
+            [siblings for siblings, _ in proofs],
+            [path_indices for _, path_indices in proofs],
+            F(1),
+        )
+
+        # Assert
+        num_hashes = 0
+        for step in list(mtip_witness.values())[0].step_instances:
+            values = {signal.__str__(): value for signal, value in step.assignments.items()}
+            if values["enable_lookup"] == 1:
+                num_hashes += 1
+        # leaves 0 and 1 are siblings and share their whole path, leaf 8 joins it from level 3
+        assert num_hashes == 20 + 3
+
+        try:
+            mtip.halo2_mock_prover(mtip_witness)
+        except Exception:
+            assert False, "Proof failed"
+
+    def test_batch_other_tree(self):
+        # Arrange
+        tree = MerkleTree(k_value=1)
+        for i in range(1, 10):
+            tree.insert(F(i))
+        indices = [0, 8]
+        leaves = [tree.leaf(index) for index in indices]
+        proofs = [tree.proof(index) for index in indices]
+        # the second leaf is in a tree with another node
+        proofs[1][0][5] = proofs[1][0][5] + F(1)
+
+        # Act & Assert
+        mtip = MtipBatchSuperCircuit(num_leaves=2)
+        with self.assertRaisesRegex(ValueError, "different roots"):
+            mtip.gen_witness(
+                leaves,
+                [siblings for siblings, _ in proofs],
+                [path_indices for _, path_indices in proofs],
+                F(1),
+            )
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+
+from chiquito.util import F
+
+from src.inclusion_proof import MtipSuperCircuit
+from src.instrumentation import StageCounters
+
+
+class InstrumentationTests(unittest.TestCase):
+    def test_mtip_stages(self):
+        # Arrange
+        siblings = [F(i) for i in range(1, 21)]
+        path_indices = [F(i % 2) for i in range(1, 21)]
+        counters = StageCounters()
+        mtip = MtipSuperCircuit()
+        mtip.observer = counters
+
+        # Act
+        mtip_witness = mtip.gen_witness(F(1), siblings, path_indices, F(1))
+        mtip.halo2_mock_prover(mtip_witness)
+
+        # Assert
+        snapshot = counters.snapshot()
+        assert set(snapshot) == {
+            "MtipSuperCircuit.gen_witness",
+            "MtipSuperCircuit.map:Mimc7MultiCircuit",
+            "MtipSuperCircuit.map:MtipCircuit",
+            "MtipSuperCircuit.halo2_mock_prover",
+        }
+        mimc7_counters = snapshot["MtipSuperCircuit.map:Mimc7MultiCircuit"]
+        # 20 hashes of 92 steps in a circuit sized for 32 of them
+        assert mimc7_counters["real_steps"] == 20 * 92
+        assert mimc7_counters["padding_steps"] == 12 * 92 + 1
+        assert snapshot["MtipSuperCircuit.map:MtipCircuit"]["real_steps"] == 20
+        assert snapshot["MtipSuperCircuit.gen_witness"]["real_steps"] == 20 * 92 + 20
+        assert all(counters["count"] == 1 for counters in snapshot.values())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+
+from src.merkle_storage import MemoryStorage, MmapStorage
+
+
+class MerkleStorageTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "tree.bin")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_memory(self):
+        # Arrange
+        storage = MemoryStorage(3)
+
+        # Act
+        storage.set(1, 2, 7)
+
+        # Assert
+        assert storage.get(1, 2) == 7
+        assert storage.get(1, 3) is None
+
+    def test_mmap(self):
+        # Arrange
+        value = 2 ** 253 + 12345
+
+        # Act
+        with MmapStorage(self.path, 4) as storage:
+            storage.set(0, 15, value)
+            storage.set(4, 0, 1)
+            storage.size = 16
+
+        # Assert
+        assert os.path.getsize(self.path) == 32 * 32
+        with MmapStorage(self.path, 4, readonly=True) as storage:
+            assert storage.size == 16
+            assert storage.get(0, 15) == value
+            assert storage.get(4, 0) == 1
+            assert storage.get(0, 14) is None
+            assert bytes(storage.raw(0, 15)) == value.to_bytes(32, "little")
+            with self.assertRaises(TypeError):
+                storage.set(0, 0, 1)
+
+    def test_mmap_depth_mismatch(self):
+        # Arrange
+        MmapStorage(self.path, 4).close()
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            MmapStorage(self.path, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import os
+import tempfile
+import unittest
+
+from chiquito.util import F
+
+from src.inclusion_proof import MtipSuperCircuit
+from src.merkle_storage import MmapStorage
+from src.merkle_tree import MerkleTree, build_tree, zero_hashes
+from src.mimc7 import mimc7
+from src.semaphore import K_VALUE, SemaphoreSuperCircuit
+
+
+def naive_root(leaves, depth, k_value):
+    level = [int(leaf) for leaf in leaves] + [0] * ((1 << depth) - len(leaves))
+    for _ in range(0, depth):
+        level = [mimc7(level[i] + level[i + 1], k_value) for i in range(0, len(level), 2)]
+    return level[0]
+
+
+def mtip_result(super_witness):
+    step_instances = list(super_witness.values())[1].step_instances
+    assignments = step_instances[len(step_instances) - 1].assignments
+    return {signal.__str__(): value for signal, value in assignments.items()}["result"]
+
+
+class MerkleTreeTests(unittest.TestCase):
+    def test_insert_update(self):
+        # Arrange
+        tree = MerkleTree(depth=4, k_value=1)
+        leaves = [F(i) for i in range(1, 7)]
+
+        # Act
+        for leaf in leaves:
+            tree.insert(leaf)
+        tree.update(2, F(30))
+        leaves[2] = F(30)
+
+        # Assert
+        assert tree.size == 6
+        assert tree.root == naive_root(leaves, 4, 1)
+        assert tree.leaf(2) == 30
+
+    def test_mmap_storage(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Arrange
+            path = os.path.join(directory, "tree.bin")
+            with MmapStorage(path, 4) as storage:
+                tree = MerkleTree(depth=4, k_value=1, storage=storage)
+                for i in range(1, 7):
+                    tree.insert(F(i))
+                root = tree.root
+
+            memory_tree = MerkleTree(depth=4, k_value=1)
+            for i in range(1, 7):
+                memory_tree.insert(F(i))
+
+            # Act
+            with MmapStorage(path, 4, readonly=True) as storage:
+                tree = MerkleTree(depth=4, k_value=1, storage=storage)
+
+                # Assert
+                assert tree.size == 6
+                assert tree.root == root == memory_tree.root
+                assert tree.proof(3) == memory_tree.proof(3)
+
+    def test_mmap_storage_zero_value(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Arrange
+            path = os.path.join(directory, "tree.bin")
+
+            # Act & Assert
+            # a leaf of value 0 would read back as the empty leaf
+            with MmapStorage(path, 4) as storage:
+                with self.assertRaises(ValueError):
+                    MerkleTree(depth=4, k_value=1, zero_value=7, storage=storage)
+
+    def test_build_tree(self):
+        # Arrange
+        leaves = [F(i) for i in range(1, 12)]
+        tree = MerkleTree(depth=5, k_value=1)
+        for leaf in leaves:
+            tree.insert(leaf)
+
+        # Act
+        built = build_tree(leaves, depth=5, k_value=1, workers=1)
+
+        # Assert
+        assert built.size == 11
+        assert built.root == tree.root
+        assert built.proof(10) == tree.proof(10)
+        assert build_tree([], depth=5, k_value=1).root == MerkleTree(depth=5, k_value=1).root
+
+    def test_zero_hashes(self):
+        # Act
+        zeros = zero_hashes(3, 1, 5)
+
+        # Assert
+        assert zeros == [5, mimc7(10, 1), mimc7(2 * mimc7(10, 1), 1), mimc7(2 * mimc7(2 * mimc7(10, 1), 1), 1)]
+        assert zero_hashes(3, 1, 5) == zeros
+
+    def test_full(self):
+        # Arrange
+        tree = MerkleTree(depth=1)
+        tree.insert(F(1))
+        tree.insert(F(2))
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            tree.insert(F(3))
+
+    def test_mtip_proof(self):
+        # Arrange
+        tree = MerkleTree(k_value=1)
+        for i in range(1, 12):
+            tree.insert(F(i))
+        siblings, path_indices = tree.proof(5)
+
+        # Act
+        mtip = MtipSuperCircuit()
+        mtip_witness = mtip.gen_witness(tree.leaf(5), siblings, path_indices, F(1))
+
+        # Assert
+        computed_root = mtip_result(mtip_witness)
+        assert computed_root == tree.root, "Roots do not match"
+
+        try:
+            mtip.halo2_mock_prover(mtip_witness)
+        except Exception:
+            assert False, "Proof failed"
+
+    def test_semaphore_proof(self):
+        # Arrange
+        identity_nullifier = F(8651960274441310489225017096417668083399439888492565663442738198004033520384)
+        identity_trapdoor = F(10508389592535728861185052047957562223060287304681057908654687548873603573619)
+        commitment = mimc7(mimc7(identity_nullifier + identity_trapdoor, K_VALUE), K_VALUE)
+        tree = MerkleTree()
+        tree.insert(F(1))
+        index = tree.insert(F(commitment))
+        tree.insert(F(2))
+        siblings, path_indices = tree.proof(index)
+
+        # Act
+        semaphore = SemaphoreSuperCircuit()
+        semaphore_witness = semaphore.gen_witness(
+            identity_nullifier,
+            identity_trapdoor,
+            siblings,
+            path_indices,
+            F(123),
+            F(1),
+        )
+
+        # Assert
+        computed_root = mtip_result(semaphore_witness)
+        assert computed_root == tree.root, "Roots do not match"
+
+        try:
+            semaphore.halo2_mock_prover(semaphore_witness)
+        except Exception:
+            assert False, "Proof failed"
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+
+from src.mimc7 import (
+    MIMC7_CACHE,
+    MIMC7_CACHE_SIZE,
+    mimc7,
+    mimc7_batch,
+    mimc7_batch_traces,
+    mimc7_hash,
+    mimc7_round,
+    mimc7_trace,
+)
+from src.mimc7_constants import FIELD_MODULUS, ROUND_CONSTANTS, ROUNDS
+
+MIMC7_HASHES = [
+    14567011075557169046979057478056029787674128426930277880058661460711427052125,
+    11692199054940982092615924479170387654172957671167590511022002236183207976922,
+    395906054129026022008845057780348852833099401379158805459513453018521692617,
+    19130493425692465471846861066180574644938572620727138458073405427305790109396,
+    3560224277096965087217247791371399647679779267609378004249118430431546034735,
+]
+
+
+class Mimc7Tests(unittest.TestCase):
+    def test_hashes(self):
+        # Arrange
+        inputs = [1, 2, 3, 4, 5]
+        k_value = 10
+
+        # Act
+        hashes = [mimc7(x_value, k_value) for x_value in inputs]
+
+        # Assert
+        assert hashes == MIMC7_HASHES
+
+    def test_round(self):
+        for x_value in [0, 1, 2, FIELD_MODULUS - 1, MIMC7_HASHES[0]]:
+            assert mimc7_round(x_value, ROUND_CONSTANTS[1]) == pow(x_value + ROUND_CONSTANTS[1], 7, FIELD_MODULUS)
+
+    def test_trace_rounds(self):
+        # Act
+        recorded = mimc7_trace(1, 10)
+
+        # Assert
+        assert recorded.x_in == 1
+        assert recorded.out == MIMC7_HASHES[0]
+        assert len(recorded.rounds) == ROUNDS + 1
+        assert recorded.rounds[0] == (1, 10, ROUND_CONSTANTS[0], 0)
+        for row, (_, k_value, c_value, row_value) in enumerate(recorded.rounds[:ROUNDS]):
+            assert (k_value, c_value, row_value) == (10, ROUND_CONSTANTS[row], row)
+        # the last row holds the state that gets the key added
+        x_value, k_value, _, row_value = recorded.rounds[ROUNDS]
+        assert row_value == ROUNDS
+        assert x_value + k_value == recorded.out
+
+    def test_cache(self):
+        # Arrange
+        MIMC7_CACHE.clear()
+        MIMC7_CACHE.resize(2)
+
+        # Act
+        first = mimc7_trace(1, 10)
+        second = mimc7_trace(1, 10)
+        mimc7(2, 10)
+        mimc7(3, 10)
+
+        # Assert
+        info = MIMC7_CACHE.info()
+        assert second is first
+        assert (info.hits, info.misses, info.currsize) == (1, 3, 2)
+        assert mimc7_trace(1, 10) is not first, "Least recently used trace was not evicted"
+
+        MIMC7_CACHE.resize(MIMC7_CACHE_SIZE)
+        MIMC7_CACHE.clear()
+
+    def test_batch(self):
+        # Arrange
+        inputs = [1, 2, 3, 4, 5, 3]
+
+        MIMC7_CACHE.clear()
+        expected_rounds = mimc7_trace(1, 10).rounds
+        MIMC7_CACHE.clear()
+
+        # Act
+        hashes = mimc7_batch(inputs, 10)
+        traces = mimc7_batch_traces(inputs, 10)
+
+        # Assert
+        assert hashes == MIMC7_HASHES + [MIMC7_HASHES[2]]
+        assert [recorded.out for recorded in traces] == hashes
+        assert traces[0].rounds == expected_rounds
+        assert traces[5] is traces[2]
+
+    def test_hash(self):
+        # Arrange
+        MIMC7_CACHE.clear()
+
+        # Act
+        hashes = [mimc7_hash(x_value, 10) for x_value in range(1, 6)]
+
+        # Assert
+        assert hashes == MIMC7_HASHES
+        assert mimc7_hash(FIELD_MODULUS + 1, 10) == MIMC7_HASHES[0]
+        # nothing was recorded
+        assert MIMC7_CACHE.info().currsize == 0
+
+
+if __name__ == '__main__':
+    unittest.main()
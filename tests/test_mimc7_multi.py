@@ -2,7 +2,9 @@ import unittest
 
 from chiquito.util import F
 
-from src.mimc7_multi import Mimc7MultiSuperCircuit
+from src.mimc7 import mimc7_round
+from src.mimc7_constants import FIELD_MODULUS, ROUND_CONSTANTS
+from src.mimc7_multi import MIMC7_LAYOUT_PACKED, ROUNDS_PER_STEP, Mimc7MultiSuperCircuit
 
 MIMC7_HASHES = [
     14567011075557169046979057478056029787674128426930277880058661460711427052125,
@@ -59,6 +61,166 @@ class Mimc7MultiTests(unittest.TestCase):
         except Exception:
             assert False, "Proof failed"
 
+    def test_repeated_inputs(self):
+        # Arrange
+        inputs = [F(1), F(2), F(1), F(3), F(2), F(1)]
+        k_value = F(10)
+
+        # Act
+        mimc7 = Mimc7MultiSuperCircuit(num_hashes=8)
+        mimc7_multi_super_witness = mimc7.gen_witness(inputs, k_value)
+
+        # Assert
+        hashes = []
+        step_instances = list(mimc7_multi_super_witness.values())[0].step_instances
+        for step in step_instances:
+            values = {signal.__str__(): value for signal, value in step.assignments.items()}
+            if values["enable_lookup"] == 1:
+                hashes.append(values["out"])
+
+        assert hashes == MIMC7_HASHES[:3]
+        assert mimc7.mimc7_multi_circuit.skipped_hashes == 3
+        assert mimc7.mimc7_multi_circuit.rows_saved == 3 * 92
+
+        try:
+            mimc7.halo2_mock_prover(mimc7_multi_super_witness)
+        except Exception:
+            assert False, "Proof failed"
+
+    def test_packed_forged_step(self):
+        # Arrange
+        mimc7 = Mimc7MultiSuperCircuit(num_hashes=8, layout=MIMC7_LAYOUT_PACKED)
+        mimc7_multi_super_witness = mimc7.gen_witness([F(1)], F(10))
+        circuit = mimc7.mimc7_multi_circuit
+        last_step = circuit.mimc7_packed_steps[-1]
+
+        # a last step on its own, consistent by itself, adding a made up input to the hashes table
+        x_value = 5
+        y_values = []
+        for i in range(0, ROUNDS_PER_STEP):
+            x_value = mimc7_round(x_value, 10 + ROUND_CONSTANTS[last_step.first_round + i])
+            y_values.append(x_value)
+        forged = last_step.gen_step_instance(42, 5, 10, len(circuit.mimc7_packed_steps) - 1, y_values,
+                                             (x_value + 10) % FIELD_MODULUS)
+
+        # Act
+        witness = list(mimc7_multi_super_witness.values())[0]
+        witness.step_instances[len(circuit.mimc7_packed_steps)] = forged
+
+        # Assert
+        with self.assertRaises(Exception):
+            mimc7.halo2_mock_prover(mimc7_multi_super_witness)
+
+    def test_columnar(self):
+        # Arrange
+        inputs = [
+            F(1), F(2), F(3), F(4), F(5), F(6), F(7), F(8), F(9), F(10),
+            F(11), F(12), F(13), F(14), F(15), F(16), F(17), F(18), F(19), F(20),
+        ]
+        k_value = F(10)
+
+        # Act
+        mimc7 = Mimc7MultiSuperCircuit(num_hashes=32, columnar=True)
+        mimc7_multi_super_witness = mimc7.gen_witness(inputs, k_value)
+        # a newer witness of the same circuit
+        mimc7.gen_witness(inputs[:3], k_value)
+
+        # Assert
+        witness = list(mimc7_multi_super_witness.values())[0]
+        assert witness.columns["out"] == MIMC7_HASHES
+        assert len(witness.columns["x"]) == 20 * 92
+        assert witness.padding == 12 * 92 + 1
+
+        hashes = []
+        for step in witness.step_instances:
+            values = {signal.__str__(): value for signal, value in step.assignments.items()}
+            if values["enable_lookup"] == 1:
+                hashes.append(values["out"])
+        assert hashes == MIMC7_HASHES
+        assert len(witness.step_instances) == 32 * 92 + 1
+        # expanding the older witness leaves the statistics of the newer one
+        assert mimc7.mimc7_multi_circuit.real_steps == 3 * 92
+
+        try:
+            mimc7.halo2_mock_prover(mimc7_multi_super_witness)
+        except Exception:
+            assert False, "Proof failed"
+
+    def test_packed(self):
+        # Arrange
+        inputs = [
+            F(1), F(2), F(3), F(4), F(5), F(6), F(7), F(8), F(9), F(10),
+            F(11), F(12), F(13), F(14), F(15), F(16), F(17), F(18), F(19), F(20),
+        ]
+        k_value = F(10)
+
+        # Act
+        mimc7 = Mimc7MultiSuperCircuit(num_hashes=32, layout=MIMC7_LAYOUT_PACKED)
+        mimc7_multi_super_witness = mimc7.gen_witness(inputs, k_value)
+
+        # Assert
+        hashes = []
+        step_instances = list(mimc7_multi_super_witness.values())[0].step_instances
+        for step in step_instances:
+            values = {signal.__str__(): value for signal, value in step.assignments.items()}
+            if values["enable_lookup"] == 1:
+                hashes.append(values["out"])
+
+        assert hashes == MIMC7_HASHES
+
+        try:
+            mimc7.halo2_mock_prover(mimc7_multi_super_witness)
+        except Exception:
+            assert False, "Proof failed"
+
+    def test_padding(self):
+        # Arrange
+        inputs = [F(1), F(2), F(3)]
+        k_value = F(10)
+
+        # Act
+        mimc7 = Mimc7MultiSuperCircuit(num_hashes=8)
+        first_witness = list(mimc7.gen_witness(inputs, k_value).values())[0]
+        mimc7_multi_super_witness = mimc7.gen_witness(inputs, k_value)
+
+        # Assert
+        step_instances = list(mimc7_multi_super_witness.values())[0].step_instances
+        padding = step_instances[3 * 92:]
+        assert len(padding) == 5 * 92 + 1
+        # a single padding instance, kept across witnesses
+        assert all(step is padding[0] for step in padding)
+        assert first_witness.step_instances[-1] is padding[0]
+
+        try:
+            mimc7.halo2_mock_prover(mimc7_multi_super_witness)
+        except Exception:
+            assert False, "Proof failed"
+
+    def test_stream(self):
+        # Arrange
+        inputs = [
+            F(1), F(2), F(3), F(4), F(5), F(6), F(7), F(8), F(9), F(10),
+            F(11), F(12), F(13), F(14), F(15), F(16), F(17), F(18), F(19), F(20),
+        ]
+        k_value = F(10)
+        mimc7 = Mimc7MultiSuperCircuit(num_hashes=32)
+
+        # Act
+        chunks = list(mimc7.mimc7_multi_circuit.stream(inputs, k_value, chunk_size=1000))
+
+        # Assert
+        assert [len(chunk) for chunk in chunks] == [1000, 1000, 945]
+        hashes = []
+        for chunk in chunks:
+            for step in chunk:
+                values = {signal.__str__(): value for signal, value in step.assignments.items()}
+                if values["enable_lookup"] == 1:
+                    hashes.append(values["out"])
+        assert hashes == MIMC7_HASHES
+        # the padding steps share a single instance
+        assert chunks[-1][-1] is chunks[-1][-2]
+        assert mimc7.mimc7_multi_circuit.padding_steps == 12 * 92 + 1
+
 
 if __name__ == '__main__':
     unittest.main()
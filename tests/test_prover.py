@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from chiquito.util import F
+
+from src import prover as prover_module
+from src.identity_cache import IDENTITY_CACHE
+from src.inclusion_proof import MtipSuperCircuit
+from src.prover import AsyncProver, Prover, circuit_for_depth, compiled_circuit, depth_for_size, prove_batch
+from src.semaphore import SemaphoreSuperCircuit
+
+SIBLINGS = [
+    F(1), F(2), F(1), F(2), F(1), F(2), F(1), F(2), F(1), F(2),
+    F(1), F(2), F(1), F(2), F(1), F(2), F(1), F(2), F(1), F(2),
+]
+PATH_INDICES = [
+    F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1),
+    F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1),
+]
+
+
+def worker_identity_cache():
+    return prover_module._worker_prover.super_circuit.identity_cache
+
+
+class ProverTests(unittest.TestCase):
+    def test_compiled_once(self):
+        # Act
+        first = Prover()
+        second = Prover()
+
+        other_thread = []
+        thread = threading.Thread(target=lambda: other_thread.append(Prover()))
+        thread.start()
+        thread.join()
+
+        # Assert
+        assert first.super_circuit is second.super_circuit
+        assert Prover(n_levels=20).super_circuit is first.super_circuit
+        assert compiled_circuit(MtipSuperCircuit) is not first.super_circuit
+        # the witness being generated is kept by the super circuit, so every thread has its own
+        assert other_thread[0].super_circuit is not first.super_circuit
+
+    def test_circuit_for_depth(self):
+        # Act
+        circuit = circuit_for_depth(MtipSuperCircuit, depth_for_size(1000))
+
+        # Assert
+        assert circuit.n_levels == 10
+        assert circuit is Prover(MtipSuperCircuit, n_levels=10).super_circuit
+        assert circuit is not circuit_for_depth(MtipSuperCircuit, 11)
+        assert [depth_for_size(size) for size in [1, 2, 3, 4, 5]] == [1, 1, 2, 2, 3]
+
+    def test_prove_many(self):
+        # Arrange
+        identity_nullifier = F(8651960274441310489225017096417668083399439888492565663442738198004033520384)
+        identity_trapdoor = F(10508389592535728861185052047957562223060287304681057908654687548873603573619)
+        prover = Prover()
+
+        # Act & Assert
+        for external_nullifier in [F(1), F(2), F(3)]:
+            try:
+                prover.prove(
+                    identity_nullifier,
+                    identity_trapdoor,
+                    SIBLINGS,
+                    PATH_INDICES,
+                    F(123),
+                    external_nullifier,
+                )
+            except Exception:
+                assert False, "Proof failed"
+
+    def test_prove_batch(self):
+        # Arrange
+        identity_nullifier = F(8651960274441310489225017096417668083399439888492565663442738198004033520384)
+        identity_trapdoor = F(10508389592535728861185052047957562223060287304681057908654687548873603573619)
+        inputs = [
+            (identity_nullifier, identity_trapdoor, SIBLINGS, PATH_INDICES, F(123), F(1)),
+            # missing levels make the mapping fail
+            (identity_nullifier, identity_trapdoor, SIBLINGS[:5], PATH_INDICES[:5], F(123), F(2)),
+            (identity_nullifier, identity_trapdoor, SIBLINGS, PATH_INDICES, F(123), F(3)),
+        ]
+
+        # Act
+        results = prove_batch(inputs, workers=2)
+
+        # Assert
+        assert [result.ok for result in results] == [True, False, True]
+        assert "IndexError" in results[1].error
+
+    def test_async_prover(self):
+        # Arrange
+        identity_nullifier = F(8651960274441310489225017096417668083399439888492565663442738198004033520384)
+        identity_trapdoor = F(10508389592535728861185052047957562223060287304681057908654687548873603573619)
+        inputs = [
+            (identity_nullifier, identity_trapdoor, SIBLINGS, PATH_INDICES, F(123), F(1)),
+            # missing levels make the mapping fail
+            (identity_nullifier, identity_trapdoor, SIBLINGS[:5], PATH_INDICES[:5], F(123), F(2)),
+            (identity_nullifier, identity_trapdoor, SIBLINGS, PATH_INDICES, F(123), F(3)),
+        ]
+
+        async def prove_all():
+            async with AsyncProver(workers=2, max_pending=2) as prover:
+                results = await asyncio.gather(*[prover.prove(*args) for args in inputs])
+                pending = prover.pending
+                # no proof can finish in that time
+                with self.assertRaises(asyncio.TimeoutError):
+                    await prover.prove(*inputs[0], timeout=0.000001)
+                return results, pending
+
+        # Act
+        results, pending = asyncio.run(prove_all())
+
+        # Assert
+        assert [result.ok for result in results] == [True, False, True]
+        assert "IndexError" in results[1].error
+        assert pending == 0
+
+    def test_async_prover_slot_timeout(self):
+        # Arrange
+        identity_nullifier = F(8651960274441310489225017096417668083399439888492565663442738198004033520384)
+        identity_trapdoor = F(10508389592535728861185052047957562223060287304681057908654687548873603573619)
+        args = (identity_nullifier, identity_trapdoor, SIBLINGS, PATH_INDICES, F(123), F(1))
+
+        async def wait_for_slot():
+            async with AsyncProver(workers=1, max_pending=1) as prover:
+                busy = asyncio.ensure_future(prover.prove(*args))
+                await asyncio.sleep(0)
+                # the only slot is taken by the busy proof
+                with self.assertRaises(TimeoutError):
+                    await prover.prove(*args, timeout=0.01)
+                pending = prover.pending
+                return await busy, pending
+
+        # Act
+        result, pending = asyncio.run(wait_for_slot())
+
+        # Assert
+        assert result.ok
+        assert pending == 1
+
+    def test_worker_identity_cache(self):
+        # Arrange
+        executor = ProcessPoolExecutor(
+            max_workers=1,
+            initializer=prover_module._init_worker,
+            initargs=(SemaphoreSuperCircuit, {}),
+        )
+
+        # Act
+        with executor:
+            identity_cache = executor.submit(worker_identity_cache).result()
+
+        # Assert
+        # the workers don't keep identities a purge in this process couldn't reach
+        assert identity_cache is None
+        assert SemaphoreSuperCircuit.identity_cache is IDENTITY_CACHE
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,30 @@ import unittest
 
 from chiquito.util import F
 
-from src.semaphore import SemaphoreSuperCircuit
+from src.identity_cache import IDENTITY_CACHE
+from src.mimc7 import MIMC7_CACHE, mimc7_batch_traces
+from src.semaphore import K_VALUE, SemaphoreMultiSuperCircuit, SemaphoreSuperCircuit
+
+OTHER_NULLIFIER = F(1234)
+OTHER_TRAPDOOR = F(5678)
+
+
+class MixedIdentitySuperCircuit(SemaphoreMultiSuperCircuit):
+    """
+    also adds the hashes of a second identity to the hashes table, so only the semaphore circuit can tell them apart
+    """
+
+    def compute_hashes(self, *args):
+        computed = super().compute_hashes(*args)
+        secret_trace = mimc7_batch_traces([OTHER_NULLIFIER + OTHER_TRAPDOOR], K_VALUE)[0]
+        other_traces = [secret_trace] + mimc7_batch_traces([secret_trace.out, OTHER_NULLIFIER + F(2)], K_VALUE)
+        other_x_values = [recorded.x_in for recorded in other_traces]
+        n = computed.num_identity_hashes
+        return computed._replace(
+            x_values=computed.x_values[:n] + other_x_values + computed.x_values[n:],
+            traces=computed.traces[:n] + other_traces + computed.traces[n:],
+            num_identity_hashes=n + len(other_traces),
+        )
 
 
 class SemaphoreTests(unittest.TestCase):
@@ -38,6 +61,144 @@ class SemaphoreTests(unittest.TestCase):
         except Exception:
             assert False, "Proof failed"
 
+    def test_evaluate(self):
+        # Arrange
+        identity_nullifier = F(8651960274441310489225017096417668083399439888492565663442738198004033520384)
+        identity_trapdoor = F(10508389592535728861185052047957562223060287304681057908654687548873603573619)
+        siblings = [
+            F(1), F(2), F(1), F(2), F(1), F(2), F(1), F(2), F(1), F(2),
+            F(1), F(2), F(1), F(2), F(1), F(2), F(1), F(2), F(1), F(2),
+        ]
+        path_indices = [
+            F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1),
+            F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1),
+        ]
+        semaphore = SemaphoreSuperCircuit()
+
+        # Act
+        outputs = semaphore.evaluate(identity_nullifier, identity_trapdoor, siblings, path_indices, F(123), F(1))
+
+        # Assert
+        secret = semaphore.mimc7(identity_nullifier + identity_trapdoor, 10)
+        assert outputs.commitment == semaphore.mimc7(secret, 10)
+        assert outputs.nullifier_hash == semaphore.mimc7(identity_nullifier + F(1), 10)
+        assert outputs.signal == F(123)
+
+        root = outputs.commitment
+        for sibling in siblings:
+            root = semaphore.mimc7(sibling + root, 10)
+        assert outputs.root == root
+
+        semaphore_witness = semaphore.gen_witness(
+            identity_nullifier,
+            identity_trapdoor,
+            siblings,
+            path_indices,
+            F(123),
+            F(1),
+        )
+        mtip_steps = list(semaphore_witness.values())[1].step_instances
+        values = {signal.__str__(): value for signal, value in mtip_steps[-1].assignments.items()}
+        assert values["result"] == outputs.root
+
+    def test_evaluate_no_cache(self):
+        # Arrange
+        siblings = [F(i) for i in range(0, 20)]
+        path_indices = [F(i % 2) for i in range(0, 20)]
+        semaphore = SemaphoreSuperCircuit()
+        identity_info = IDENTITY_CACHE.info()
+        mimc7_info = MIMC7_CACHE.info()
+
+        # Act
+        outputs = semaphore.evaluate(F(31), F(37), siblings, path_indices, F(123), F(1))
+
+        # Assert
+        assert IDENTITY_CACHE.info() == identity_info
+        assert MIMC7_CACHE.info() == mimc7_info
+        computed = semaphore.compute_hashes(F(31), F(37), siblings, path_indices, [F(1)])
+        assert outputs.root == computed.hashes[-1]
+        assert outputs.nullifier_hash == computed.nullifier_hashes[0]
+        assert outputs.commitment == computed.commitment
+
+    def test_multi_signal(self):
+        # Arrange
+        identity_nullifier = F(8651960274441310489225017096417668083399439888492565663442738198004033520384)
+        identity_trapdoor = F(10508389592535728861185052047957562223060287304681057908654687548873603573619)
+        signals = [(F(123), F(1)), (F(456), F(2)), (F(789), F(3))]
+        siblings = [
+            F(1), F(2), F(1), F(2), F(1), F(2), F(1), F(2), F(1), F(2),
+            F(1), F(2), F(1), F(2), F(1), F(2), F(1), F(2), F(1), F(2),
+        ]
+        path_indices = [
+            F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1),
+            F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1),
+        ]
+
+        # Act
+        semaphore = SemaphoreMultiSuperCircuit(num_signals=3)
+        semaphore_witness = semaphore.gen_witness(
+            identity_nullifier,
+            identity_trapdoor,
+            siblings,
+            path_indices,
+            signals,
+        )
+
+        # Assert
+        mimc7_steps = list(semaphore_witness.values())[0].step_instances
+        num_hashes = 0
+        for step in mimc7_steps:
+            values = {signal.__str__(): value for signal, value in step.assignments.items()}
+            if values["enable_lookup"] == 1:
+                num_hashes += 1
+        # secret, commitment, one nullifier per signal and the tree levels
+        assert num_hashes == 2 + 3 + 20
+        assert len(list(semaphore_witness.values())[2].step_instances) == 3
+
+        try:
+            semaphore.halo2_mock_prover(semaphore_witness)
+        except Exception:
+            assert False, "Proof failed"
+
+    def test_mixed_identities(self):
+        # Arrange
+        identity_nullifier = F(8651960274441310489225017096417668083399439888492565663442738198004033520384)
+        identity_trapdoor = F(10508389592535728861185052047957562223060287304681057908654687548873603573619)
+        siblings = [
+            F(1), F(2), F(1), F(2), F(1), F(2), F(1), F(2), F(1), F(2),
+            F(1), F(2), F(1), F(2), F(1), F(2), F(1), F(2), F(1), F(2),
+        ]
+        path_indices = [
+            F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1),
+            F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1),
+        ]
+        semaphore = MixedIdentitySuperCircuit(num_signals=2)
+        semaphore_witness = semaphore.gen_witness(
+            identity_nullifier,
+            identity_trapdoor,
+            siblings,
+            path_indices,
+            [(F(123), F(1)), (F(456), F(2))],
+        )
+        other_secret = semaphore.mimc7(OTHER_NULLIFIER + OTHER_TRAPDOOR, K_VALUE)
+
+        # Act
+        # the second signal is of the other identity, whose hashes are all in the table
+        semaphore_steps = list(semaphore_witness.values())[2].step_instances
+        semaphore_steps[1] = semaphore.semaphore_circuit.step.gen_step_instance(
+            OTHER_NULLIFIER,
+            OTHER_TRAPDOOR,
+            F(2),
+            semaphore.mimc7(OTHER_NULLIFIER + F(2), K_VALUE),
+            F(456),
+            other_secret,
+            semaphore.mimc7(other_secret, K_VALUE),
+        )
+
+        # Assert
+        with self.assertRaises(Exception):
+            semaphore.halo2_mock_prover(semaphore_witness)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+
+from chiquito.util import F
+
+from src.semaphore import SemaphoreSuperCircuit
+from src.witness_file import FILE_HEADER, MAGIC, VERSION, load_witness, save_witness
+
+
+class WitnessFileTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "witness.bin")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        # Arrange
+        identity_nullifier = F(8651960274441310489225017096417668083399439888492565663442738198004033520384)
+        identity_trapdoor = F(10508389592535728861185052047957562223060287304681057908654687548873603573619)
+        signal_hash = F(123)
+        external_nullifier = F(1)
+        siblings = [
+            F(1), F(2), F(1), F(2), F(1), F(2), F(1), F(2), F(1), F(2),
+            F(1), F(2), F(1), F(2), F(1), F(2), F(1), F(2), F(1), F(2),
+        ]
+        path_indices = [
+            F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1),
+            F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1), F(1),
+        ]
+        semaphore = SemaphoreSuperCircuit()
+        semaphore_witness = semaphore.gen_witness(
+            identity_nullifier,
+            identity_trapdoor,
+            siblings,
+            path_indices,
+            signal_hash,
+            external_nullifier,
+        )
+
+        # Act
+        save_witness(self.path, semaphore, semaphore_witness)
+        with load_witness(self.path) as witness_file:
+            loaded_witness = witness_file.super_witness(semaphore)
+            repeats = witness_file.witnesses[0].repeats
+
+        # Assert
+        # the padding of the MIMC7 circuit is stored as a count
+        assert repeats > 0
+        assert list(loaded_witness) == list(semaphore_witness)
+        for key, witness in semaphore_witness.items():
+            loaded_steps = loaded_witness[key].step_instances
+            assert len(loaded_steps) == len(witness.step_instances)
+            for step, loaded_step in zip(witness.step_instances, loaded_steps):
+                assert loaded_step.step_type_uuid == step.step_type_uuid
+                assert {str(signal): value for signal, value in loaded_step.assignments.items()} == \
+                       {str(signal): value for signal, value in step.assignments.items()}
+
+        try:
+            semaphore.halo2_mock_prover(loaded_witness)
+        except Exception:
+            assert False, "Proof failed"
+
+    def test_not_a_witness(self):
+        # Arrange
+        with open(self.path, "wb") as file:
+            file.write(b"MIMCTREE" + bytes(56))
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            load_witness(self.path)
+
+    def test_truncated(self):
+        # Arrange
+        # the name of the super circuit is longer than the rest of the file
+        header = FILE_HEADER.pack(MAGIC, VERSION, 1)
+        with open(self.path, "wb") as file:
+            file.write(header + (20).to_bytes(2, "little") + b"Semaphore")
+
+        # Act & Assert
+        with self.assertRaisesRegex(ValueError, "Truncated"):
+            load_witness(self.path)
+        with open(self.path, "wb") as file:
+            file.write(header[:-1])
+        with self.assertRaisesRegex(ValueError, "Truncated"):
+            load_witness(self.path)